@@ -1,68 +1,49 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import numpy as np
-import re
 import os
 import json
+import functools
 from datetime import timedelta
-from google.oauth2 import service_account
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import (
-    RunReportRequest,
-    DateRange,
-    Metric,
-    Dimension,
-    Filter,
-    FilterExpression,
-    FilterExpressionList,
-    OrderBy,
-)
+from data_loader import load_datasets
+from sources import statistic_files, tariff_files
+from refresher import BackgroundRefresher, register_sources
+from snapshot_store import SnapshotStore, DEFAULT_ROOT, CACHE_FILE
+from cache_backend import SQLiteCacheBackend
+from ga4_cache import DailyReportCache
+from metrics import daily_metrics, target_metrics, comparison_metrics
+from cube import TariffCube
+from range_index import CubeIndex, COMPARISON_OFFSETS, shift_period
+from cohorts import CohortIndex
+from timeseries import StatFrames
+from rollups import GRANULARITIES, MAX_ROLLUP_ROWS, choose_granularity, rollup_metrics
+from profiling import RerunProfiler, DEFAULT_DIR as DEFAULT_PROFILE_DIR
+from charts import line_chart, heatmap, cached_figure, FigureCache, DEFAULT_FIGURE_CACHE_SIZE
+from formatting import format_number, ordered_tariffs, comparison_table
+from ga4_client import build_client, AsyncReportRunner, REPORT_DEADLINE
+from ga4_quota import QuotaScheduler, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_CONCURRENT
+from singleflight import SingleFlight
 
 st.set_page_config(page_title="CASES Dashboard", layout="wide")
 
-# 🔐 Підключення до Google Analytics
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["google_credentials"]
+# 🔬 Профілювання запуску: ?profile=1 в адресі або секрет profiling = true
+profiler = RerunProfiler(
+    enabled=st.query_params.get("profile") == "1" or bool(st.secrets.get("profiling", False)),
+    output_dir=st.secrets.get("profile_dir", DEFAULT_PROFILE_DIR),
 )
-PROPERTY_ID = st.secrets["property_id"]
+profiler.start()
 
-# Ініціалізуємо клієнт GA4
-client = BetaAnalyticsDataClient(credentials=credentials)
+# 🔐 Google Analytics: клієнт створюється один раз на процес (get_ga4_client)
+PROPERTY_ID = st.secrets["property_id"]
 
-# ==== Глобальна функція форматування чисел ====
+# ==== Глобальна функція форматування чисел (formatting.format_number) ====
 
 from streamlit.delta_generator import DeltaGenerator
 
-def format_number(val):
-    """
-    Форматує числа у стилі UA:
-    - цілі: розділяє тисячі пробілом (12 345 678)
-    - дробові: розділяє тисячі пробілом і використовує кому як десятковий роздільник (12 345 678,90)
-    """
-    import numpy as _np
-
-    # ціле число
-    if isinstance(val, (int, _np.integer)):
-        s = f"{val:,}"            # '12,345,678'
-        return s.replace(",", " ")  # '12 345 678'
-
-    # число з плаваючою крапкою
-    elif isinstance(val, (float, _np.floating)):
-        s = f"{val:,.2f}"         # '12,345,678.90'
-        s = s.replace(",", " ")   # '12 345 678.90'
-        return s.replace(".", ",")  # '12 345 678,90'
-
-    # рядок із десятковим роздільником у вигляді крапки
-    elif isinstance(val, str):
-        # замінюємо крапку на кому
-        return val.replace(".", ",")
-
-    # усе інше повертаємо без змін
-    return val
-
 # ==== Підміна методу metric у DeltaGenerator, щоб автоматично форматувати числа ====
-_orig_dd_metric = DeltaGenerator.metric
+# Скрипт виконується заново на кожен перезапуск: беремо оригінальний метод,
+# а не обгортку з попереднього запуску, щоб обгортки не вкладалися одна в одну
+_orig_dd_metric = getattr(DeltaGenerator.metric, "__wrapped__", DeltaGenerator.metric)
 
 def _dd_metric(self, label: str, value, delta=None, **kwargs):
     """
@@ -75,17 +56,109 @@ def _dd_metric(self, label: str, value, delta=None, **kwargs):
     return _orig_dd_metric(self, label, formatted_value, formatted_delta, **kwargs)
 
 # Підміна оригінальної функції
+_dd_metric.__wrapped__ = _orig_dd_metric
 DeltaGenerator.metric = _dd_metric
 
-@st.cache_data(show_spinner=False)
-def load_tariff_df(file_id):
-    """Завантажує CSV з Google Drive, перетворює дату і повертає DataFrame"""
-    url = f"https://drive.google.com/uc?export=download&id={file_id}"
-    df = pd.read_csv(url)
-    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
-    df = df.dropna(subset=["date"])
-    df = df.sort_values("date")
-    return df
+@st.cache_resource(show_spinner=False)
+def get_cache_backend():
+    """
+    Спільний кеш усіх процесів сервера на хості (SQLite-файл): знімки Drive,
+    денні звіти GA4 і таблиці KPI. Репліки за балансувальником з одним
+    cache_path не завантажують і не рахують те саме кожна окремо.
+    """
+    return SQLiteCacheBackend(
+        st.secrets.get("cache_path", os.path.join(st.secrets.get("snapshot_dir", DEFAULT_ROOT), CACHE_FILE))
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_store():
+    """Одне сховище знімків Drive-файлів на весь процес сервера"""
+    return SnapshotStore(
+        backend=get_cache_backend(),
+        ttl=st.secrets.get("snapshot_ttl_minutes", 15) * 60,
+        # Дописувати лише нові рядки CSV (HTTP Range) замість повного завантаження
+        incremental=st.secrets.get("incremental_ingest", True),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_ga4_cache():
+    """Подобовий кеш результатів GA4, спільний для всіх сесій і процесів"""
+    return DailyReportCache(backend=get_cache_backend())
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_tariff_cube(fingerprint, _frames):
+    """Куб день × тариф × показник; перебудовується лише коли змінюється відбиток даних"""
+    return TariffCube.from_frames(_frames)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_cube_index(fingerprint, _cube):
+    """Префіксні суми куба для сум за довільний період без проходу по днях"""
+    return CubeIndex(_cube)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_cohort_index(fingerprint, _cube):
+    """Когорти всіх тарифів (утримання і Cohort LTV); перебудовуються лише при зміні даних"""
+    return CohortIndex(_cube)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_stat_frames(fingerprint, _frames):
+    """Таблиці статистики з індексом за датою; перебудовуються лише при зміні даних"""
+    return StatFrames(_frames, names=list(statistic_files))
+
+@st.cache_resource(show_spinner=False)
+def get_ga4_client():
+    """
+    Клієнт GA4 — один на процес сервера: спільні облікові дані з кешованим
+    токеном і gRPC-канал з keep-alive замість нового клієнта на кожен перезапуск.
+    За замовчуванням — асинхронний: усі звіти сторінки відправляються одночасно.
+    """
+    if st.secrets.get("ga4_async", True):
+        return AsyncReportRunner(
+            st.secrets["google_credentials"],
+            deadline=st.secrets.get("ga4_deadline_seconds", REPORT_DEADLINE),
+        )
+    return build_client(st.secrets["google_credentials"])
+
+@st.cache_resource(show_spinner=False)
+def get_ga4_scheduler():
+    """Планувальник усіх запитів до GA4 процесу: відро токенів, повтори і стан квот"""
+    return QuotaScheduler(
+        rate=st.secrets.get("ga4_requests_per_second", DEFAULT_RATE),
+        burst=st.secrets.get("ga4_burst", DEFAULT_BURST),
+        max_concurrent=st.secrets.get("ga4_max_concurrent", DEFAULT_MAX_CONCURRENT),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_ga4_flights():
+    """Однакові звіти GA4, які одночасно запитують кілька сесій, виконуються один раз"""
+    return SingleFlight()
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    """Кеш готових графіків Plotly — спільний для всіх сесій"""
+    return FigureCache(max_entries=st.secrets.get("figure_cache_size", DEFAULT_FIGURE_CACHE_SIZE))
+
+@st.cache_resource(show_spinner=False)
+def get_refresher():
+    """
+    Фоновий оновлювач даних — один на процес сервера. Стартує з першим
+    запуском скрипта, одразу прогріває всі джерела і далі оновлює їх за розкладом.
+    """
+    refresher = BackgroundRefresher(interval=st.secrets.get("refresh_interval_minutes", 15) * 60)
+    register_sources(
+        refresher,
+        get_snapshot_store(),
+        tariff_files,
+        statistic_files,
+        ga4_client=get_ga4_client,  # клієнт створюється при першому оновленні GA4
+        property_id=PROPERTY_ID,
+        ga4_cache=get_ga4_cache(),
+        ga4_scheduler=get_ga4_scheduler(),
+    )
+    refresher.start()
+    return refresher
+
+refresher = get_refresher()
 
 # CSS для плавного скролу з відступом
 st.markdown(
@@ -101,471 +174,340 @@ st.markdown(
 # Заголовок дашборда
 st.title("CASES Dashboard")
 
-# 📂 Список файлів зі статистикою по компаніям, студентам, профілям та тріалам
-statistic_files = {
-    "companies": "1OVBwvUjNbJFY_cvLCh6RynL_WKowqXJ2",
-    "students": "1gJTkWUssnOKKlBSIxk6rQETuEaFTA9EL",
-    "users": "1nuxKPhBP1qx09FcuCPG1uIobrG92dxHE",
-    "trials": "1AsIIcj-2lYQWXHfPoMWsdtA46nqUbduH",
-    "companies_awards": "1XXE81yxnme1LUis4EoobyJ_4chMrl3Cr",
-    "companies_services": "19zeQ2ArE6DdlU1WtIUzLY43sfW3tFc1A",
-    "news": "1Dlc-hFOQkjXoszv4uZVulFgZ4AxslxlP",
-    "articles": "1sYk2s9HyS-YuXieILm6eAyf1uHLSSVel",
-    "cases": "1VEWKmAv2EmFkcYTNWzsvtcpaeoYREqqu",
-}
-
-# 📦 Список тарифів
-tariff_files = {
-    "Full Access 0UAH": "1XoUhnsGUeVL3qwHMYJbk4mpCn3lhoEkB",
-    "Full Access 250UAH": "1G60JUAk_vQVXVQnjZF9uK2VwUbYDlK6P",
-    "Full Access 350UAH": "1eYubeexGVF5MKJFZIF6ZOwEfDDad1zPB",
-    "Full Access 390UAH": "1xeTeJV8JvOowE8JG5I6tog3euIKvDDNj",
-    "Full Access 550UAH": "1b5fMQ_5Y522zJssO_AikhkLBTfI3p_Bf",
-    "Full Access 1000UAH": "1mOZsP89AhTufFvG2nSmbV6w5GSOKyGVx",
-    "Full Access 1200UAH": "1M1u8AAQHFv81BNtlvi4P6llT0OO817dj",
-    "Theory Only 0UAH": "1SyARqxHQzEPlK9GEuUvNV1SEFeghJ1pr",
-    "Theory Only 250UAH": "1q4c0m434WK46Thei_pgkdVB5lLDnQqZz",
-    "Theory Only 500UAH": "1eFhAfdSC2LOLX3tJX5BWyGM693d0ASyK",
-    "Theory Only 600UAH": "1EdZRWRQxLUfKprV5GgRWjjR_Jzyc7CEh",
+# 🔑 Відбитки даних з метаданих знімків — без читання і хешування таблиць.
+# Беруться до завантаження: знімок, оновлений між ними, підхопить наступний перезапуск
+snapshot_store = get_snapshot_store()
+tariff_snapshots = snapshot_store.fingerprint(tariff_files.values())
+stat_snapshots = snapshot_store.fingerprint(statistic_files.values())
+
+# 🧾 Паралельне завантаження всіх тарифів і файлів статистики
+with profiler.span("Завантаження тарифів і статистики (Drive)"):
+    load_result = load_datasets(
+        {("tariff", name): file_id for name, file_id in tariff_files.items()}
+        | {("stat", name): file_id for name, file_id in statistic_files.items()},
+        fetch=snapshot_store.get,
+    )
+tariff_frames = {
+    name: frame for (kind, name), frame in load_result.frames.items() if kind == "tariff"
 }
-
-tabs = st.tabs([
-    "Статистика передплат",
-    "Порівняння тарифів",
-    "Активність",
-    "Застосунок CASES",
-    "Сайт cases.media"
-])
-
-with tabs[0]:
-
-        # 🧩 Контрол для вибору тарифів
-    selected_tariffs = st.multiselect(
-        "Оберіть тарифи",
-        options=list(tariff_files.keys()),
-        default=["Full Access 250UAH"]
+for (kind, name), error in load_result.errors.items():
+    st.warning(f"Не вдалося завантажити файл {name}: {error}")
+
+# 🧊 Спільний куб усіх тарифів (перебудовується лише при зміні даних)
+with profiler.span("Куб тарифів"):
+    # Назви завантажених файлів — частина ключа: файл з помилкою змінює склад куба
+    tariff_fingerprint = (tariff_snapshots, tuple(sorted(tariff_frames)))
+    tariff_cube = get_tariff_cube(tariff_fingerprint, tariff_frames)
+    cube_index = get_cube_index(tariff_fingerprint, tariff_cube)
+
+# 👥 Когорти передплатників за місяцем залучення (теж один раз на відбиток даних)
+with profiler.span("Когорти тарифів"):
+    cohort_index = get_cohort_index(tariff_fingerprint, tariff_cube)
+
+# 📈 Таблиці статистики, відсортовані та проіндексовані за датою (порожні, якщо файл не завантажився)
+loaded_stats = {name: frame for (kind, name), frame in load_result.frames.items() if kind == "stat"}
+with profiler.span("Таблиці статистики"):
+    stat_frames = get_stat_frames((stat_snapshots, tuple(sorted(loaded_stats))), loaded_stats)
+
+# 📆 Діапазон доступних дат — спільний для всіх вкладок
+min_date, max_data_date = tariff_cube.data_range()
+
+# 🔎 Контрол з календарем (останні 30 днів за замовчуванням)
+from datetime import datetime
+
+# 📅 Сьогоднішній день
+today = pd.to_datetime(datetime.today().date())
+
+st.sidebar.header("Фільтр за датою")
+
+# 🧭 Випадаючий список періодів
+preset_option = st.sidebar.selectbox(
+    "Швидкий вибір періоду:",
+    (
+        "Останні 30 днів",
+        "Попередній місяць",
+        "Останні 3 місяці",
+        "Останні 6 місяців",
+        "Останній рік",
+        "Весь час"
     )
+)
 
-    # 🧾 Завантаження та об'єднання CSV-файлів
-    dfs = []
-    for tariff in selected_tariffs:
-        file_id = tariff_files[tariff]
-        csv_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-        df_part = pd.read_csv(csv_url)
-        df_part["tariff_name"] = tariff  # додаємо колонку з назвою тарифу
-
-        # Додаємо колонку з ціною тарифу (витягуємо з назви)
-        match = re.search(r"(\d+)UAH", tariff)
-        if match:
-            df_part["price"] = int(match.group(1))
-        else:
-            df_part["price"] = 0  # якщо раптом немає ціни в назві тарифу
-
-        dfs.append(df_part)
+# 🔁 Обчислення періоду на основі вибору
+if preset_option == "Останні 30 днів":
+    end_default = min(today, max_data_date)
+    start_default = end_default - timedelta(days=30)
+
+elif preset_option == "Попередній місяць":
+    first_day_this_month = today.replace(day=1)
+    last_day_prev_month = first_day_this_month - timedelta(days=1)
+    start_default = last_day_prev_month.replace(day=1)
+    end_default = last_day_prev_month
+
+elif preset_option == "Останні 3 місяці":
+    end_default = min(today, max_data_date)
+    start_default = end_default - pd.DateOffset(months=3)
+
+elif preset_option == "Останні 6 місяців":
+    end_default = min(today, max_data_date)
+    start_default = end_default - pd.DateOffset(months=6)
+
+elif preset_option == "Останній рік":
+    end_default = min(today, max_data_date)
+    start_default = end_default - pd.DateOffset(years=1)
+
+elif preset_option == "Весь час":
+    start_default = min_date
+    end_default = max_data_date
+
+# 📆 Календар з передзаповненим періодом
+start_date, end_date = st.sidebar.date_input(
+    "Або оберіть вручну:",
+    value=[start_default, end_default],
+    min_value=min_date,
+    max_value=max_data_date
+)
 
-    # 🧮 Об'єднуємо всі обрані таблиці в одну
-    df = pd.concat(dfs, ignore_index=True)
+# 📊 Порівняння з тим самим періодом раніше (дельти під метриками)
+comparison_option = st.sidebar.selectbox(
+    "Порівняти з:",
+    ["Без порівняння"] + list(COMPARISON_OFFSETS)
+)
 
-    # 🗓 Обробка дати
-    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
-    df = df.dropna(subset=["date"])
+# Посилання на інструкцію з оновлення даних
+st.sidebar.markdown(
+    '<a href="https://docs.google.com/document/d/1YkcEtLCvnzlOZdBO5tPzCs35sQ87u9xmHiJuPS2TuBY/edit?tab=t.0" target="_blank">Як оновити дані</a>',
+    unsafe_allow_html=True
+)
 
-    # 📆 Діапазон доступних дат
-    min_date = df["date"].min()
-    max_date = df["date"].max()
+# 🔄 Стан фонового оновлення даних
+if refresher.last_refresh is not None:
+    st.sidebar.caption(f"Дані оновлено у фоні: {refresher.last_refresh:%d.%m.%Y %H:%M}")
+else:
+    st.sidebar.caption("Триває перше фонове завантаження даних…")
+
+with st.sidebar.expander("Стан джерел даних"):
+    st.dataframe(refresher.status_table(), hide_index=True, use_container_width=True)
+    drive_flights = get_snapshot_store().flights.stats()
+    ga4_flights = get_ga4_flights().stats()
+    st.caption(
+        f"Об'єднано однакових запитів: Drive — {drive_flights['coalesced']} "
+        f"з {drive_flights['calls']}, GA4 — {ga4_flights['coalesced']} з {ga4_flights['calls']}"
+    )
 
-    # 🔎 Контрол з календарем (останні 30 днів за замовчуванням)
-    from datetime import datetime
+# ⏱ Час завантаження кожного файлу
+with st.sidebar.expander("Час завантаження даних"):
+    st.dataframe(load_result.latency_table(), hide_index=True, use_container_width=True)
 
-    # 📅 Сьогоднішній день
-    today = pd.to_datetime(datetime.today().date())
-    min_date = df["date"].min()
-    max_data_date = df["date"].max()
+ad_budget = 5000  # рекламний бюджет
 
-    st.sidebar.header("Фільтр за датою")
+# 📅 Гранулярність графіків: дні для коротких періодів, ISO-тижні чи місяці для довгих
+granularity = choose_granularity(start_date, end_date) if st.secrets.get("rollups", True) else "D"
 
-    # 🧭 Випадаючий список періодів
-    preset_option = st.sidebar.selectbox(
-        "Швидкий вибір періоду:",
-        (
-            "Останні 30 днів",
-            "Попередній місяць",
-            "Останні 3 місяці",
-            "Останні 6 місяців",
-            "Останній рік",
-            "Весь час"
+def granularity_caption():
+    """Підпис під заголовком вкладки, якщо графіки показані не по днях"""
+    if granularity != "D":
+        st.caption(
+            f"Період довший за {MAX_ROLLUP_ROWS} днів, тож графіки показують дані по {GRANULARITIES[granularity]}: "
+            "потоки — сума за період, кількості — на його кінець, тріали — середнє."
         )
+def show_profile(run_profiler, flamegraph_path):
+    """Час запуску, розбивка по секціях, статистика кешу графіків і файл флеймграфа"""
+    st.caption(f"Увесь запуск: {run_profiler.total * 1000:.0f} мс")
+    figure_stats = get_figure_cache().stats()
+    st.caption(
+        f"Кеш графіків: {figure_stats['hits']} влучань, {figure_stats['misses']} промахів, "
+        f"{figure_stats['size']} фігур"
     )
+    st.dataframe(run_profiler.breakdown(), hide_index=True, use_container_width=True)
+    if flamegraph_path:
+        st.caption(f"Флеймграф збережено: {flamegraph_path}")
+    elif run_profiler.error:
+        st.caption(f"Семплюючий профайлер недоступний: {run_profiler.error}")
 
-    # 🔁 Обчислення періоду на основі вибору
-    if preset_option == "Останні 30 днів":
-        end_default = min(today, max_data_date)
-        start_default = end_default - timedelta(days=30)
-
-    elif preset_option == "Попередній місяць":
-        first_day_this_month = today.replace(day=1)
-        last_day_prev_month = first_day_this_month - timedelta(days=1)
-        start_default = last_day_prev_month.replace(day=1)
-        end_default = last_day_prev_month
-
-    elif preset_option == "Останні 3 місяці":
-        end_default = min(today, max_data_date)
-        start_default = end_default - pd.DateOffset(months=3)
-
-    elif preset_option == "Останні 6 місяців":
-        end_default = min(today, max_data_date)
-        start_default = end_default - pd.DateOffset(months=6)
-
-    elif preset_option == "Останній рік":
-        end_default = min(today, max_data_date)
-        start_default = end_default - pd.DateOffset(years=1)
-
-    elif preset_option == "Весь час":
-        start_default = min_date
-        end_default = max_data_date
-
-    # 📆 Календар з передзаповненим періодом
-    start_date, end_date = st.sidebar.date_input(
-        "Або оберіть вручну:",
-        value=[start_default, end_default],
-        min_value=min_date,
-        max_value=max_data_date
-    )
-
-    # Посилання на інструкцію з оновлення даних
-    st.sidebar.markdown(
-        '<a href="https://docs.google.com/document/d/1YkcEtLCvnzlOZdBO5tPzCs35sQ87u9xmHiJuPS2TuBY/edit?tab=t.0" target="_blank">Як оновити дані</a>',
-        unsafe_allow_html=True
-    )
-
-    # Визначаємо колонки для числового перетворення
-    cols_to_convert = [
-        "start", "new", "reactivated",
-        "upgradedEnter", "downgradedEnter",
-        "end", "upgradedExit", "downgradedExit"
-    ]
-
-    # 🔍 Фільтрація даних за вибраним періодом
-    mask = (df["date"] >= pd.to_datetime(start_date)) & (df["date"] <= pd.to_datetime(end_date))
-    filtered_raw = df.loc[mask].copy()
-
-    # 📊 Завантаження та обробка статистики по компаніям, студентам і профілям
-    def load_stat_file(file_id):
-        url = f"https://drive.google.com/uc?export=download&id={file_id}"
-        df_stat = pd.read_csv(url)
-        df_stat["date"] = pd.to_datetime(df_stat["date"], format="%Y-%m-%d", errors="coerce")
-        df_stat = df_stat.dropna(subset=["date"])
-        return df_stat
-
-    # Завантаження статистики
-    companies_df = load_stat_file(statistic_files["companies"])
-    students_df  = load_stat_file(statistic_files["students"])
-    users_df     = load_stat_file(statistic_files["users"])
-    trials_df    = load_stat_file(statistic_files["trials"])
-    companies_awards_df   = load_stat_file(statistic_files["companies_awards"])
-    companies_services_df = load_stat_file(statistic_files["companies_services"])
-    news_df     = load_stat_file(statistic_files["news"])
-    articles_df = load_stat_file(statistic_files["articles"])
-    cases_df    = load_stat_file(statistic_files["cases"])
-
-    # Фільтрація по вибраному періоду
-    companies_filtered = companies_df[(companies_df["date"] >= pd.to_datetime(start_date)) &
-                                    (companies_df["date"] <= pd.to_datetime(end_date))]
-    students_filtered  = students_df [(students_df["date"]  >= pd.to_datetime(start_date)) &
-                                    (students_df["date"]  <= pd.to_datetime(end_date))]
-    users_filtered     = users_df    [(users_df["date"]     >= pd.to_datetime(start_date)) &
-                                    (users_df["date"]     <= pd.to_datetime(end_date))]
-    trials_filtered    = trials_df    [(trials_df["date"]     >= pd.to_datetime(start_date)) &
-                                    (trials_df["date"]     <= pd.to_datetime(end_date))]
-    
-    companies_awards_filtered = companies_awards_df[
-        (companies_awards_df["date"] >= pd.to_datetime(start_date)) &
-        (companies_awards_df["date"] <= pd.to_datetime(end_date))
-    ]
-
-    companies_services_filtered = companies_services_df[
-        (companies_services_df["date"] >= pd.to_datetime(start_date)) &
-        (companies_services_df["date"] <= pd.to_datetime(end_date))
-    ]
-
-    news_filtered = news_df[
-        (news_df["date"] >= pd.to_datetime(start_date)) &
-        (news_df["date"] <= pd.to_datetime(end_date))
-    ]
-
-    articles_filtered = articles_df[
-        (articles_df["date"] >= pd.to_datetime(start_date)) &
-        (articles_df["date"] <= pd.to_datetime(end_date))
-    ]
-
-    cases_filtered = cases_df[
-        (cases_df["date"] >= pd.to_datetime(start_date)) &
-        (cases_df["date"] <= pd.to_datetime(end_date))
-    ]
-    
-    # Обчислення медіани для тріалів за вибраний період
-    median_trials = trials_filtered["active"].median() if not trials_filtered.empty else 0
-
-    # 🔧 Перетворення колонок на числові типи
-    for col in cols_to_convert:
-        filtered_raw[col] = pd.to_numeric(filtered_raw.get(col, 0), errors="coerce").fillna(0)
-
-    # Агрегування даних по даті для всіх вибраних тарифів
-    aggregated_df = (
-        filtered_raw
-        .groupby("date", as_index=False)[cols_to_convert]
-        .sum()
+def profiled_fragment(render):
+    """
+    st.fragment для вкладки. Перезапуск лише фрагмента (наприклад, зміна
+    фільтра у вкладці) не проходить через початок і кінець скрипта, тож
+    профілюється окремим профайлером, а розбивка показується у вкладці —
+    фрагмент не може писати в бічну панель.
+    """
+    @st.fragment
+    @functools.wraps(render)
+    def fragment():
+        global profiler
+        if not profiler.enabled or profiler.running:
+            render()
+            return
+        profiler = RerunProfiler(enabled=True, output_dir=profiler.output_dir)
+        profiler.start()
+        render()
+        flamegraph_path = profiler.stop()
+        with st.expander("Профілювання перезапуску вкладки", expanded=True):
+            show_profile(profiler, flamegraph_path)
+    return fragment
+
+@profiled_fragment
+def render_subscriptions():
+    """Вкладка «Статистика передплат»"""
+
+    # 🧩 Контрол для вибору тарифів
+    selected_tariffs = st.multiselect(
+        "Оберіть тарифи",
+        options=list(tariff_files.keys()),
+        default=["Full Access 250UAH"]
     )
 
-    # Розрахунок Churned Users
-    aggregated_df["Churned Users"] = (
-        aggregated_df["start"]
-        + aggregated_df["new"]
-        + aggregated_df["reactivated"]
-        + aggregated_df["upgradedEnter"]
-        + aggregated_df["downgradedEnter"]
-        - aggregated_df["end"]
-        - aggregated_df["upgradedExit"]
-        - aggregated_df["downgradedExit"]
-    ).clip(lower=0)
-
-    # 📊 Метрики на початок та кінець періоду
-    start_value_row = df[df["date"] == pd.to_datetime(start_date)]
-    start_value = int(
-        aggregated_df.loc[
-            aggregated_df["date"] == pd.to_datetime(start_date),
-            "start"
-        ].sum()
-    ) if not aggregated_df.empty else "—"
-
-    end_value_row = df[df["date"] == pd.to_datetime(end_date)]
-    end_value = int(
-        aggregated_df.loc[
-            aggregated_df["date"] == pd.to_datetime(end_date),
-            "end"
-        ].sum()
-    ) if not aggregated_df.empty else "—"
-
-    # 📈 Метрики за сумою
-    new_subs = int(aggregated_df["new"].sum())
-    reactivated = int(aggregated_df["reactivated"].sum())
-    upgraded = int(aggregated_df["upgradedEnter"].sum())
-    downgraded = int(aggregated_df["downgradedEnter"].sum())
-    churned_total= int(aggregated_df["Churned Users"].sum())
-
-    # 🔁 Розрахунок Churned Users по днях
-    churned_series = (
-        aggregated_df["start"]
-        + aggregated_df["new"]
-        + aggregated_df["reactivated"]
-        + aggregated_df["upgradedEnter"]
-        + aggregated_df["downgradedEnter"]
-        - aggregated_df["end"]
-        - aggregated_df["upgradedExit"]
-        - aggregated_df["downgradedExit"]
-    ).clip(lower=0)
-
-    churned_total = int(churned_series.sum())    
+    # Ряди по всіх обраних тарифах (по днях або зведені по тижнях/місяцях): потоки, Churned Users і MRR
+    with profiler.span("Агрегація рядів"):
+        if granularity == "D":
+            # 🔍 Зріз куба з обраними тарифами за вибраний період (без копіювання даних по днях)
+            aggregated_df = daily_metrics(tariff_cube.select(selected_tariffs).window(start_date, end_date))
+        else:
+            aggregated_df = rollup_metrics(cube_index, selected_tariffs, start_date, end_date, granularity)
+
+    # 📊 Метрики за період і цільові показники — одним векторизованим розрахунком
+    with profiler.span("Цільові показники"):
+        kpis = target_metrics(cube_index, selected_tariffs, start_date, end_date, ad_budget)
+        # LTV за утриманням когорт, залучених у вибраному періоді
+        cohort_ltv = cohort_index.ltv(selected_tariffs, start_date, end_date)
+
+        # Ті самі метрики за попередній період — для дельт під метриками
+        # Попередній період до початку даних дає нулі замість None (потоки, MRR) —
+        # тоді весь поточний показник виглядав би як приріст, тож дельти не показуємо
+        prev_kpis = None
+        if comparison_option in COMPARISON_OFFSETS:
+            prev_start, prev_end = shift_period(start_date, end_date, COMPARISON_OFFSETS[comparison_option])
+            if pd.Timestamp(prev_start) >= pd.Timestamp(min_date):
+                prev_kpis = target_metrics(cube_index, selected_tariffs, prev_start, prev_end, ad_budget)
+        deltas = {}
+        if prev_kpis is not None and prev_kpis["start_value"] is not None:
+            deltas = {
+                key: kpis[key] - prev_kpis[key]
+                for key in ("start_value", "end_value", "new", "reactivated", "upgraded", "downgraded", "churned", "mrr")
+                if kpis[key] is not None and prev_kpis[key] is not None
+            }
+
+    start_value = kpis["start_value"] if kpis["start_value"] is not None else "—"
+    end_value = kpis["end_value"] if kpis["end_value"] is not None else "—"
+    new_subs = kpis["new"]
+    reactivated = kpis["reactivated"]
+    upgraded = kpis["upgraded"]
+    downgraded = kpis["downgraded"]
+    churned_total = kpis["churned"]
 
     # 📌 Виведення основних метрик в один ряд
     st.markdown("<a id='metrics'></a>", unsafe_allow_html=True)
     st.subheader("Статистика передплат")
 
     col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
-    col1.metric("Користувачів\nна початок періоду", start_value)
-    col2.metric("Користувачів\nна кінець періоду", end_value)
-    col3.metric("Нових\nкористувачів", new_subs)
-    col4.metric("Реактивованих\nкористувачів", reactivated)
-    col5.metric("Upgrade\n(вхід)", upgraded)
-    col6.metric("Downgrade\n(вхід)", downgraded)
-    col7.metric("Churned\nUsers", churned_total)
-
-    # ➕ Додавання колонки Churned Users до таблиці
-    aggregated_df["Churned Users"] = churned_series
+    col1.metric("Користувачів\nна початок періоду", start_value, deltas.get("start_value"))
+    col2.metric("Користувачів\nна кінець періоду", end_value, deltas.get("end_value"))
+    col3.metric("Нових\nкористувачів", new_subs, deltas.get("new"))
+    col4.metric("Реактивованих\nкористувачів", reactivated, deltas.get("reactivated"))
+    col5.metric("Upgrade\n(вхід)", upgraded, deltas.get("upgraded"))
+    col6.metric("Downgrade\n(вхід)", downgraded, deltas.get("downgraded"))
+    col7.metric("Churned\nUsers", churned_total, deltas.get("churned"), delta_color="inverse")
+    granularity_caption()
 
     # 📈 Графік "Користувачі на початок періоду"
     st.subheader("Користувачі на початок періоду")
 
-    df_start = aggregated_df[["date", "start"]].rename(
-        columns={"start": "Користувачі на початок періоду"}
-    )
-
-    fig_start = px.line(
-        df_start,
-        x="date",
-        y="Користувачі на початок періоду",
-        markers=True,
-    )
-    fig_start.update_layout(xaxis_title=None, yaxis_title=None, showlegend=False)
-    fig_start.update_xaxes(tickmode="linear", tickangle=45)
+    with profiler.span("Графік: Користувачі на початок періоду"):
+        df_start = aggregated_df[["date", "start"]].rename(
+            columns={"start": "Користувачі на початок періоду"}
+        )
 
-    st.plotly_chart(fig_start, use_container_width=True)
+        fig_start = line_chart(
+            df_start,
+            x="date",
+            y="Користувачі на початок періоду",
+            showlegend=False,
+            cache=get_figure_cache(),
+        )
+        st.plotly_chart(fig_start, use_container_width=True)
 
     # 📈 Графік "Нові, реактивовані та втрачені користувачі"
     st.subheader("Нові, реактивовані та втрачені користувачі")
 
-    df_flow = aggregated_df[["date", "new", "reactivated", "Churned Users"]].rename(
-        columns={
-            "new": "Нові",
-            "reactivated": "Реактивовані",
-            "Churned Users": "Втрачені користувачі"
-        }
-    )
-
-    fig_flow = px.line(
-        df_flow,
-        x="date",
-        y=["Нові", "Реактивовані", "Втрачені користувачі"],
-        markers=True,
-    )
-    fig_flow.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.3,
-            xanchor="center",
-            x=0.5,
-            title=None
+    with profiler.span("Графік: Нові, реактивовані та втрачені користувачі"):
+        df_flow = aggregated_df[["date", "new", "reactivated", "Churned Users"]].rename(
+            columns={
+                "new": "Нові",
+                "reactivated": "Реактивовані",
+                "Churned Users": "Втрачені користувачі"
+            }
         )
-    )
-    fig_flow.update_xaxes(tickmode="linear", tickangle=45)
 
-    st.plotly_chart(fig_flow, use_container_width=True)
+        fig_flow = line_chart(
+            df_flow,
+            x="date",
+            y=["Нові", "Реактивовані", "Втрачені користувачі"],
+            legend_below=True,
+            cache=get_figure_cache(),
+        )
+        st.plotly_chart(fig_flow, use_container_width=True)
 
     # 💰 Цільові показники
     st.markdown("<a id='monthly-targets'></a>", unsafe_allow_html=True)
     st.subheader("Цільові показники")
 
-    ad_budget = 5000  # рекламний бюджет
-
-    # MRR
-
-    # Групуємо по назві тарифу та розраховуємо середній start
-    mrr = 0
-    for tariff in selected_tariffs:
-        # Фільтруємо агрегований датафрейм по тарифу
-        tariff_df = filtered_raw[filtered_raw["tariff_name"] == tariff]
-        if not tariff_df.empty:
-            avg_start = tariff_df["start"].mean()
-            price = tariff_df["price"].iloc[0]  # ціна для цього тарифу
-            mrr += avg_start * price
-
-    mrr = int(round(mrr))
-
-    # Churn Rate
-    try:
-        churn_rate = churned_total / start_value
-        churn_rate_str = f"{churn_rate:.1%}"
-    except (ZeroDivisionError, TypeError):
-        churn_rate = None
-        churn_rate_str = "—"
-
-    # Growth Rate
-    # 💡 Розрахунок MRR на початок і кінець періоду з урахуванням усіх тарифів
-
-    def calc_mrr_on_date(date, df):
-        mrr = 0
-        for tariff in selected_tariffs:
-            sub = df[(df["date"] == pd.to_datetime(date)) & (df["tariff_name"] == tariff)]
-            if not sub.empty:
-                start = sub["start"].values[0]
-                price = sub["price"].values[0]
-                mrr += start * price
-        return mrr
-
-    mrr_first = calc_mrr_on_date(start_date, filtered_raw)
-    mrr_last  = calc_mrr_on_date(end_date, filtered_raw)
-
-    try:
-        growth_rate = (mrr_last - mrr_first) / mrr_first if mrr_first != 0 else 0
-        growth_rate_str = f"{growth_rate:.1%}"
-    except ZeroDivisionError:
-        growth_rate_str = "—"
-
-    # Lifetime
-    if churn_rate and churn_rate != 0:
-        lifetime = 1 / churn_rate
-        lifetime_str = f"{lifetime:.1f}"
-    else:
-        lifetime = None
-        lifetime_str = "—"
-
-    # ARPPU — середній дохід на платника
-    try:
-        arppu = mrr / end_value if end_value else None
-        arppu_str = f"{arppu:.2f}" if arppu is not None else "—"
-    except ZeroDivisionError:
-        arppu = None
-        arppu_str = "—"
-
-    # LTV — життєвий цикл клієнта
-    if lifetime and arppu:
-        ltv = lifetime * arppu
-        ltv_str = f"{int(ltv)}"
-    else:
-        ltv = None
-        ltv_str = "—"
-
-    # CAC — вартість залучення одного користувача
-    try:
-        cac = ad_budget / new_subs if new_subs else None
-        cac_str = f"{cac:.2f}" if cac is not None else "—"
-    except ZeroDivisionError:
-        cac = None
-        cac_str = "—"
-
-    # LTV / CAC
-    try:
-        ltv_cac = ltv / cac if (ltv is not None and cac) else None
-        ltv_cac_str = f"{ltv_cac:.2f}" if ltv_cac is not None else "—"
-    except ZeroDivisionError:
-        ltv_cac_str = "—"
+    mrr = kpis["mrr"]
+    churn_rate_str = f"{kpis['churn_rate']:.1%}" if kpis["churn_rate"] is not None else "—"
+    growth_rate_str = f"{kpis['growth_rate']:.1%}"
+    lifetime_str = f"{kpis['lifetime']:.1f}" if kpis["lifetime"] is not None else "—"
+    arppu_str = f"{kpis['arppu']:.2f}" if kpis["arppu"] is not None else "—"
+    ltv_str = f"{int(kpis['ltv'])}" if kpis["ltv"] is not None else "—"
+    cohort_ltv_str = f"{int(cohort_ltv)}" if cohort_ltv is not None else "—"
+    cac_str = f"{kpis['cac']:.2f}" if kpis["cac"] is not None else "—"
+    ltv_cac_str = f"{kpis['ltv_cac']:.2f}" if kpis["ltv_cac"] is not None else "—"
 
     # 🧮 Виведення цільових метрик
     col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
-    col1.metric("MRR", mrr)
+    col1.metric("MRR", mrr, deltas.get("mrr"))
     col2.metric("Churn rate", churn_rate_str)
     col3.metric("Growth rate", growth_rate_str)
     col4.metric("Lifetime (міс.)", lifetime_str)
     col5.metric("LTV", ltv_str)
+    col6.metric("LTV (когорти)", cohort_ltv_str)
     #col6.metric("CAC", cac_str)
     #col7.metric("LTV / CAC", ltv_cac_str)
 
     # 📊 Графік MRR по днях
     st.subheader("MRR")
 
-    # Додаємо в aggregated_df стовпець MRR по днях (з урахуванням цін тарифів)
-    def calc_mrr_day(day):
-        # day — дата
-        mrr_day = 0
-        for tariff in selected_tariffs:
-            # Знаходимо всі рядки в filtered_raw з потрібною датою і тарифом
-            sub = filtered_raw[(filtered_raw["date"] == day) & (filtered_raw["tariff_name"] == tariff)]
-            if not sub.empty:
-                start = sub["start"].values[0]
-                price = sub["price"].values[0]
-                mrr_day += start * price
-        return mrr_day
-
-    aggregated_df["MRR"] = aggregated_df["date"].apply(calc_mrr_day)
-
-    # Будуємо графік за новим стовпчиком
-    fig_mrr = px.line(
-        aggregated_df,
-        x="date",
-        y="MRR",
-        markers=True
-    )
-    fig_mrr.update_layout(xaxis_title=None, yaxis_title=None)
-    fig_mrr.update_xaxes(tickmode="linear", tickangle=45)
+    with profiler.span("Графік: MRR"):
+        # Будуємо графік за новим стовпчиком
+        fig_mrr = line_chart(aggregated_df, x="date", y="MRR", cache=get_figure_cache())
+        st.plotly_chart(fig_mrr, use_container_width=True)
 
-    st.plotly_chart(fig_mrr, use_container_width=True)
+    # 👥 Теплова карта утримання когорт
+    st.subheader("Утримання за когортами")
+
+    with profiler.span("Графік: Утримання за когортами"):
+        retention = cohort_index.retention_table(selected_tariffs, start_date, end_date)
+        if retention.empty:
+            st.info("У вибраному періоді немає нових чи реактивованих передплатників.")
+        else:
+            # Рядки — місяць залучення з розміром когорти, колонки — місяців від залучення
+            labels = [f"{cohort:%Y-%m} ({users})" for cohort, users in retention["users"].items()]
+            fig_retention = heatmap(
+                retention.drop(columns="users").set_axis(labels),
+                x_title="Місяців від залучення",
+                y_title="Когорта",
+                cache=get_figure_cache(),
+            )
+            st.plotly_chart(fig_retention, use_container_width=True)
+        st.caption(
+            "Когорта — нові й реактивовані передплатники місяця. Утримання змодельовано з денних "
+            "потоків тарифів: усі когорти тарифу в календарному місяці втрачають однакову частку."
+        )
 
 #----------------------------------------------------------------------------------------------------------------
 
-with tabs[1]:
+@profiled_fragment
+def render_comparison():
+    """Вкладка «Порівняння тарифів»"""
 
     # 📋 Таблиця даних
     # st.subheader("Дані за вибраний період:")
@@ -575,136 +517,47 @@ with tabs[1]:
     st.markdown("<a id='tariff-comparison'></a>", unsafe_allow_html=True)
     st.subheader("Порівняння тарифів")
 
-    # 🧾 Показники, які хочемо порівнювати
-    metrics_list = [
-        "Користувачів на початок періоду",
-        "Користувачів на кінець періоду",
-        "Нові користувачі",
-        "Реактивовані користувачі",
-        "Churned users",
-        "MRR",
-        "Churn rate",
-        "Lifetime (міс.)",
-        "ARPPU",
-        "LTV",
-        "CAC",
-        "LTV / CAC"
-    ]
-
-    # 🔀 Групування тарифів
-    tariff_names = list(tariff_files.keys())
-    theory_tariffs = [name for name in tariff_names if "Theory Only" in name]
-    full_tariffs = [name for name in tariff_names if "Full Access" in name]
-
-    # 🧱 Створення заголовків MultiIndex
-    multi_columns = pd.MultiIndex.from_tuples([
-        ("Лише теорія", name.replace("Theory Only ", "").replace("UAH", " грн")) for name in theory_tariffs
-    ] + [
-        ("Повний доступ", name.replace("Full Access ", "").replace("UAH", " грн")) for name in full_tariffs
-    ])
-
-    # 📐 Порожня таблиця з MultiIndex-колонками
-    data = pd.DataFrame(index=metrics_list, columns=multi_columns)
-
-    # 🔄 Проходимо по всім тарифам і обчислюємо метрики
-    for tariff in theory_tariffs + full_tariffs:
-        file_id = tariff_files[tariff]
-        csv_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-
-        try:
-            df_tariff = load_tariff_df(file_id)
-
-            # Додаємо колонку price, витягуючи ціну з назви тарифу
-            match = re.search(r"(\d+)UAH", tariff)
-            if match:
-                df_tariff["price"] = int(match.group(1))
-            else:
-                df_tariff["price"] = 0        
-
-            # Фільтр по даті
-            mask = (df_tariff["date"] >= pd.to_datetime(start_date)) & (df_tariff["date"] <= pd.to_datetime(end_date))
-            df_filtered = df_tariff[mask].copy()
-
-            # Перетворення на числа
-            for col in cols_to_convert:
-                if col in df_filtered.columns:
-                    df_filtered[col] = pd.to_numeric(df_filtered[col], errors="coerce").fillna(0)
-                else:
-                    df_filtered[col] = 0
-
-            # Метрики
-            start_row = df_tariff[df_tariff["date"] == pd.to_datetime(start_date)]
-            end_row = df_tariff[df_tariff["date"] == pd.to_datetime(end_date)]
-
-            start_val = int(start_row["start"].values[0]) if not start_row.empty else 0
-            end_val = int(end_row["end"].values[0]) if not end_row.empty else 0
-            new_val = int(df_filtered["new"].sum())
-            reactivated_val = int(df_filtered["reactivated"].sum())
-
-            churned_series = (
-                df_filtered["start"]
-                + df_filtered["new"]
-                + df_filtered["reactivated"]
-                + df_filtered["upgradedEnter"]
-                + df_filtered["downgradedEnter"]
-                - df_filtered["end"]
-                - df_filtered["upgradedExit"]
-                - df_filtered["downgradedExit"]
-            ).clip(lower=0)
-
-            churned_val = int(churned_series.sum())
-            if not df_filtered.empty:
-                price = df_filtered["price"].iloc[0]
-                mrr_val = int(df_filtered["start"].mean() * price)
-            else:
-                mrr_val = 0
-
-            churn_rate = churned_val / start_val if start_val else None
-            lifetime = 1 / churn_rate if churn_rate else None
-            arppu = mrr_val / end_val if end_val else None
-            ltv = lifetime * arppu if lifetime and arppu else None
-            cac = ad_budget / new_val if new_val else None
-            ltv_cac = ltv / cac if ltv and cac else None
-
-            # Визначаємо колонку в таблиці
-            col_label = tariff.replace("Theory Only ", "").replace("Full Access ", "").replace("UAH", " грн")
-            col_group = "Лише теорія" if "Theory Only" in tariff else "Повний доступ"
-
-            # Запис значень у таблицю
-            data.loc["Користувачів на початок періоду", (col_group, col_label)] = start_val
-            data.loc["Користувачів на кінець періоду", (col_group, col_label)] = end_val
-            data.loc["Нові користувачі", (col_group, col_label)] = new_val
-            data.loc["Реактивовані користувачі", (col_group, col_label)] = reactivated_val
-            data.loc["Churned users", (col_group, col_label)] = churned_val
-            data.loc["MRR", (col_group, col_label)] = mrr_val
-            data.loc["Churn rate", (col_group, col_label)] = f"{churn_rate:.1%}" if churn_rate is not None else "—"
-            data.loc["Lifetime (міс.)", (col_group, col_label)] = f"{lifetime:.1f}" if lifetime is not None else "—"
-            data.loc["ARPPU", (col_group, col_label)] = f"{arppu:.0f}" if arppu is not None else "—"
-            data.loc["LTV", (col_group, col_label)] = f"{ltv:.0f}" if ltv is not None else "—"
-            data.loc["CAC", (col_group, col_label)] = f"{cac:.2f}" if cac is not None else "—"
-            data.loc["LTV / CAC", (col_group, col_label)] = f"{ltv_cac:.2f}" if ltv_cac is not None else "—"
-
-        except Exception as e:
-            st.warning(f"Не вдалося завантажити або обробити дані для тарифу {tariff}: {e}")
-
-    #Тимчасово приховуємо два рядки таблиці
-    hide_metrics = ["CAC", "LTV / CAC"]
-    data = data.drop(index=hide_metrics)
-
-    # 🖼 Вивід кастомної таблиці з центруванням заголовків
-    st.markdown(
-        data.style
-            .format(format_number)  # застосовуємо функцію форматування до всіх комірок
-            .set_table_styles([
-                {"selector": "thead th", "props": [("text-align", "center")]}
-            ])
-            .to_html(),
-        unsafe_allow_html=True
-    )
+    # 🔄 Метрики всіх тарифів одним векторизованим розрахунком по префіксних сумах,
+    # 🔀 спочатку «Лише теорія», потім «Повний доступ»
+    with profiler.span("Метрики порівняння"):
+        # Рахується щоразу: з префіксних сум це дешевше, ніж читання зі спільного кешу і розбір Parquet
+        comparison = comparison_metrics(cube_index, start_date, end_date, ad_budget)
+        data = comparison_table(comparison, ordered_tariffs(list(tariff_files.keys())))
+
+    # 🖼 Нативна таблиця: рядки — показники, колонки — «група · ціна» тарифу
+    with profiler.span("Таблиця порівняння"):
+        st.dataframe(
+            data,
+            use_container_width=True,
+            height=(len(data) + 1) * 35 + 3,  # усі рядки без прокрутки
+            column_config={"_index": st.column_config.TextColumn("Показник")},
+        )
 
 #--------------------------------------------------------------------------------------
 
-with tabs[2]:
+@profiled_fragment
+def render_activity():
+    """Вкладка «Активність»"""
+
+    # 📊 Статистика по компаніям, студентам, профілям тощо — ряди всіх таблиць за період одним викликом
+    # (по днях або зведені по тижнях/місяцях)
+    with profiler.span("Зрізи статистики"):
+        stats = stat_frames.rollup_all(start_date, end_date, granularity)
+    granularity_caption()
+
+    companies_filtered = stats["companies"]
+    students_filtered  = stats["students"]
+    users_filtered     = stats["users"]
+    trials_filtered    = stats["trials"]
+    companies_awards_filtered   = stats["companies_awards"]
+    companies_services_filtered = stats["companies_services"]
+    news_filtered     = stats["news"]
+    articles_filtered = stats["articles"]
+    cases_filtered    = stats["cases"]
+
+    # Обчислення медіани для тріалів за вибраний період (по днях, незалежно від гранулярності графіка)
+    daily_trials = stat_frames.slice("trials", start_date, end_date)
+    median_trials = daily_trials["active"].median() if not daily_trials.empty else 0
 
     # 🧾 Розрахунок загальної статистики компаній, студентів і профілів
     # Беремо останнє значення total в отфильтрованных данных (companies_filtered, students_filtered, users_filtered)
@@ -726,71 +579,67 @@ with tabs[2]:
     st.markdown("<a id='companies-students-profiles-trials'></a>", unsafe_allow_html=True)
     row1_col1, row1_col2 = st.columns(2)
 
-    with row1_col1:
+    with row1_col1, profiler.span("Графік: Компанії"):
         st.subheader("Компанії")
         chart_comp = companies_filtered[["date", "total"]].rename(columns={"total": "Компанії"})
-        fig_comp = px.line(
+        fig_comp = line_chart(
             chart_comp,
             x="date",
             y="Компанії",
-            markers=True,
+            width=0.5,
+            cache=get_figure_cache(),
         )
-        fig_comp.update_layout(xaxis_title=None, yaxis_title=None)
-        fig_comp.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_comp, use_container_width=True)
 
-    with row1_col2:
+    with row1_col2, profiler.span("Графік: Тріали"):
         st.subheader("Тріали")
         chart_trial = trials_filtered[["date", "active"]].rename(columns={"active": "Тріали"})
-        fig_trial = px.line(
+        # Графік з горизонтальною лінією-медіаною
+        fig_trial = line_chart(
             chart_trial,
             x="date",
             y="Тріали",
-            markers=True,
+            width=0.5,
+            hline=dict(
+                y=median_trials,
+                line_dash="dash",
+                line_color="orange",
+                annotation_text=f"Медіана: {int(median_trials)}",
+                annotation_position="top left",
+            ),
+            cache=get_figure_cache(),
         )
-        fig_trial.update_layout(xaxis_title=None, yaxis_title=None)
-        fig_trial.update_xaxes(tickmode="linear", tickangle=45)
-        # Додаємо горизонтальну лінію-медіану
-        fig_trial.add_hline(
-            y=median_trials,
-            line_dash="dash",
-            line_color="orange",
-            annotation_text=f"Медіана: {int(median_trials)}",
-            annotation_position="top left"
-        )        
         st.plotly_chart(fig_trial, use_container_width=True)
 
     row2_col1, row2_col2 = st.columns(2)
 
-    with row2_col1:
+    with row2_col1, profiler.span("Графік: Студенти"):
         st.subheader("Студенти")
         chart_stud = students_filtered[["date", "total"]].rename(columns={"total": "Студенти"})
-        fig_stud = px.line(
+        fig_stud = line_chart(
             chart_stud,
             x="date",
             y="Студенти",
-            markers=True,
+            width=0.5,
+            cache=get_figure_cache(),
         )
-        fig_stud.update_layout(xaxis_title=None, yaxis_title=None)
-        fig_stud.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_stud, use_container_width=True)
 
-    with row2_col2:
+    with row2_col2, profiler.span("Графік: Профілі"):
         st.subheader("Профілі")
         chart_prof = users_filtered[["date", "total"]].rename(columns={"total": "Профілі"})
-        fig_prof = px.line(
+        fig_prof = line_chart(
             chart_prof,
             x="date",
             y="Профілі",
-            markers=True,
+            width=0.5,
+            cache=get_figure_cache(),
         )
-        fig_prof.update_layout(xaxis_title=None, yaxis_title=None)
-        fig_prof.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_prof, use_container_width=True)
 
     row3_col1, row3_col2 = st.columns(2)
 
-    with row3_col1:
+    with row3_col1, profiler.span("Графік: Активність компаній"):
         st.subheader("Активність компаній")
                 
         awards_and_services = pd.DataFrame({
@@ -804,324 +653,218 @@ with tabs[2]:
             on="date", how="outer"
         ).sort_values("date")
                    
-        fig_activity = px.line(
+        fig_activity = line_chart(
             awards_and_services,
             x="date",
             y=["Додали нагороди", "Додали послуги"],
-            markers=True
+            width=0.5,
+            legend_below=True,
+            cache=get_figure_cache(),
         )
-        fig_activity.update_layout(
-            xaxis_title=None, 
-            yaxis_title=None,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.3,
-                xanchor="center",
-                x=0.5
-            ),
-            legend_title_text=''
-        )
-        fig_activity.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_activity, use_container_width=True)
 
-    with row3_col2:
+    with row3_col2, profiler.span("Графік: Новини"):
         st.subheader("Новини")
-        fig_news = px.line(
+        fig_news = line_chart(
             news_filtered,
             x="date",
             y="total",
-            markers=True
-        )
-        fig_news.update_layout(
-            xaxis_title=None,
-            yaxis_title=None,
-            showlegend=False
+            width=0.5,
+            showlegend=False,
+            cache=get_figure_cache(),
         )
-        fig_news.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_news, use_container_width=True)
 
     row4_col1, row4_col2 = st.columns(2)
 
-    with row4_col1:
+    with row4_col1, profiler.span("Графік: Статті"):
         st.subheader("Статті")
-        fig_articles = px.line(
+        fig_articles = line_chart(
             articles_filtered,
             x="date",
             y="total",
-            markers=True
+            width=0.5,
+            showlegend=False,
+            cache=get_figure_cache(),
         )
-        fig_articles.update_layout(
-            xaxis_title=None,
-            yaxis_title=None,
-            showlegend=False
-        )
-        fig_articles.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_articles, use_container_width=True)
 
-    with row4_col2:
+    with row4_col2, profiler.span("Графік: Кейси"):
         st.subheader("Кейси")
-        fig_cases = px.line(
+        fig_cases = line_chart(
             cases_filtered,
             x="date",
             y="total",
-            markers=True
-        )
-        fig_cases.update_layout(
-            xaxis_title=None,
-            yaxis_title=None,
-            showlegend=False
+            width=0.5,
+            showlegend=False,
+            cache=get_figure_cache(),
         )
-        fig_cases.update_xaxes(tickmode="linear", tickangle=45)
         st.plotly_chart(fig_cases, use_container_width=True)
 
-with tabs[3]:
-
-# Графік "Активні користувачі PWA-застосунку"        
-    st.subheader("Активні користувачі PWA-застосунку")
+#----------------------------------------------------------------------------
 
-    # 📊 Запит до GA4: активні користувачі з режимом 'standalone' (PWA)
-    pwa_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="activeUsers")],
-        date_ranges=[DateRange(
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )],
-        dimension_filter=FilterExpression(
-            filter=Filter(
-                field_name="customUser:display_mode",
-                string_filter=Filter.StringFilter(value="standalone")
-            )
-        )
-    )
+def load_ga4_frames(keys):
+    """
+    Звіти GA4 вкладки через спільний кеш, об'єднання однакових запитів і
+    планувальник квот. Якщо GA4 недоступний і в кеші нічого немає — показує
+    помилку і повертає None замість падіння вкладки.
+    """
+    from ga4_reports import fetch_site_reports  # модулі GA4 імпортуються лише при відкритті вкладки
 
-    pwa_response = client.run_report(pwa_request)
-
-    # 📊 Запит до GA4: активні користувачі PWA на Android
-    pwa_android_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="activeUsers")],
-        date_ranges=[DateRange(
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )],
-        dimension_filter=FilterExpression(
-            and_group=FilterExpressionList(
-                expressions=[
-                    FilterExpression(
-                        filter=Filter(
-                            field_name="customUser:display_mode",
-                            string_filter=Filter.StringFilter(value="standalone")
-                        )
-                    ),
-                    FilterExpression(
-                        filter=Filter(
-                            field_name="operatingSystem",
-                            string_filter=Filter.StringFilter(value="Android")
-                        )
-                    )
-                ]
-            )
+    scheduler = get_ga4_scheduler()
+    try:
+        frames = fetch_site_reports(
+            get_ga4_client(), PROPERTY_ID, start_date, end_date,
+            cache=get_ga4_cache(), keys=keys, flights=get_ga4_flights(), scheduler=scheduler
         )
-    )
-
-    pwa_android_response = client.run_report(pwa_android_request)
+    except Exception as e:
+        st.error(f"Не вдалося отримати звіти GA4: {e}")
+        return None
+    if scheduler.exhausted():
+        st.warning("Квоту GA4 тимчасово вичерпано — показано останні дані з кешу")
+    return frames
 
-    # 🧾 Створення DataFrame для всіх користувачів
-    pwa_data = []
-    for row in pwa_response.rows:
-        date = row.dimension_values[0].value
-        count = int(row.metric_values[0].value)
-        pwa_data.append({"date": pd.to_datetime(date), "Всі користувачі PWA": count})
+@profiled_fragment
+def render_app():
+    """Вкладка «Застосунок CASES»"""
 
-    pwa_df = pd.DataFrame(pwa_data).sort_values("date")
-
-    # 🧾 Створення DataFrame для Android
-    pwa_android_data = []
-    for row in pwa_android_response.rows:
-        date = row.dimension_values[0].value
-        count = int(row.metric_values[0].value)
-        pwa_android_data.append({"date": pd.to_datetime(date), "Користувачі PWA з Android": count})
-
-    pwa_android_df = pd.DataFrame(pwa_android_data).sort_values("date")
+# Графік "Активні користувачі PWA-застосунку"        
+    st.subheader("Активні користувачі PWA-застосунку")
 
-    # 🔗 Об'єднання двох DataFrame
-    combined_df = pd.merge(pwa_df, pwa_android_df, on="date", how="outer").fillna(0)
+    # 📊 Звіти GA4 цієї вкладки — одночасно,
+    # денні звіти запитуються лише за дні, яких ще немає в кеші
+    with profiler.span("GA4: pwa, installs"):
+        ga4_frames = load_ga4_frames(("pwa", "installs"))
+    if ga4_frames is None:
+        return
 
-    # 📈 Графік активних користувачів PWA та Android PWA
-    fig_pwa = px.line(
-        combined_df,
-        x="date",
-        y=["Всі користувачі PWA", "Користувачі PWA з Android"],
-        markers=True
-    )
+    with profiler.span("Графік: Активні користувачі PWA-застосунку"):
+        # 🧾 Активні користувачі PWA: усі та з Android
+        combined_df = ga4_frames["pwa"]
 
-    fig_pwa.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        legend=dict(
-            orientation="h",         # горизонтально
-            yanchor="bottom",        # прив'язка знизу
-            y=-0.3,                  # трохи нижче графіка
-            xanchor="center",        # по центру
-            x=0.5,                   # по центру по осі X
-            title=None               # прибираємо заголовок "legend"
+        # 📈 Графік активних користувачів PWA та Android PWA
+        fig_pwa = line_chart(
+            combined_df,
+            x="date",
+            y=["Всі користувачі PWA", "Користувачі PWA з Android"],
+            legend_below=True,
+            connectgaps=True,
+            cache=get_figure_cache(),
         )
-    )
-
-    fig_pwa.update_xaxes(tickmode="linear", tickangle=45)
-    fig_pwa.update_traces(connectgaps=True)
-    st.plotly_chart(fig_pwa, use_container_width=True)
+        st.plotly_chart(fig_pwa, use_container_width=True)
     
 # Графік "Встановлення PWA-застосунку"        
     st.subheader("Встановлення PWA-застосунку")
 
-    # 📊 Запит до GA4: кількість встановлень PWA (подія pwa_installed)
-    install_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="eventCount")],
-        date_ranges=[DateRange(start_date=str(start_date), end_date=str(end_date))],
-        dimension_filter=FilterExpression(
-            filter=Filter(
-                field_name="eventName",
-                string_filter=Filter.StringFilter(value="pwa_installed")
-            )
-        )
-    )
+    with profiler.span("Графік: Встановлення PWA-застосунку"):
+        # 📄 Встановлення PWA (подія pwa_installed)
+        install_df = ga4_frames["installs"]
 
-    install_response = client.run_report(install_request)
+        # 📈 Графік встановлень PWA
+        fig_install = line_chart(
+            install_df,
+            x="date",
+            y="Встановлення PWA",
+            cache=get_figure_cache(),
+        )
+        st.plotly_chart(fig_install, use_container_width=True)
 
-    # 📄 Перетворення у DataFrame
-    install_data = []
-    for row in install_response.rows:
-        date = row.dimension_values[0].value
-        count = int(row.metric_values[0].value)
-        install_data.append({"date": pd.to_datetime(date), "Встановлення PWA": count})
+#----------------------------------------------------------------------------
 
-    install_df = pd.DataFrame(install_data).sort_values("date")
+@profiled_fragment
+def render_site():
+    """Вкладка «Сайт cases.media»"""
+    st.subheader("Унікальні користувачі сайту та сеанси")
 
-    # 📈 Графік встановлень PWA
-    fig_install = px.line(
-        install_df,
-        x="date",
-        y="Встановлення PWA",
-        markers=True
-    )
-    fig_install.update_layout(xaxis_title=None, yaxis_title=None)
-    fig_install.update_xaxes(tickmode="linear", tickangle=45)
-    st.plotly_chart(fig_install, use_container_width=True)
+    # 📊 Звіти GA4 цієї вкладки — одночасно
+    with profiler.span("GA4: traffic, pages"):
+        ga4_frames = load_ga4_frames(("traffic", "pages"))
+    if ga4_frames is None:
+        return
 
-#----------------------------------------------------------------------------
-with tabs[4]:
-    st.subheader("Унікальні користувачі сайту та сеанси")
+    with profiler.span("Графік: Унікальні користувачі сайту та сеанси"):
+        # 🔗 Унікальні користувачі та сеанси (один багатометричний звіт)
+        merged_df = ga4_frames["traffic"]
 
-    # 📊 Запит до GA4: унікальні користувачі
-    users_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="totalUsers")],
-        date_ranges=[DateRange(
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )]
-    )
-    users_response = client.run_report(users_request)
-    users_data = []
-    for row in users_response.rows:
-        date = row.dimension_values[0].value
-        count = int(row.metric_values[0].value or 0)
-        users_data.append({"date": pd.to_datetime(date), "Унікальні користувачі": count})
-    users_df = pd.DataFrame(users_data).sort_values("date")
-
-    # 📊 Запит до GA4: сеанси
-    sessions_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="sessions")],
-        date_ranges=[DateRange(
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )]
-    )
-    sessions_response = client.run_report(sessions_request)
-    sessions_data = []
-    for row in sessions_response.rows:
-        date = row.dimension_values[0].value
-        count = int(row.metric_values[0].value or 0)
-        sessions_data.append({"date": pd.to_datetime(date), "Сеанси": count})
-    sessions_df = pd.DataFrame(sessions_data).sort_values("date")
-
-    # 🔗 Об'єднуємо два набори даних
-    merged_df = pd.merge(users_df, sessions_df, on="date", how="outer").fillna(0)
-
-    # 📈 Малюємо обидві серії на одному графіку
-    fig_combined = px.line(
-        merged_df,
-        x="date",
-        y=["Унікальні користувачі", "Сеанси"],
-        markers=True
-    )
-    fig_combined.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.3,
-            xanchor="center",
-            x=0.5,
-            title=None
+        # 📈 Малюємо обидві серії на одному графіку
+        fig_combined = line_chart(
+            merged_df,
+            x="date",
+            y=["Унікальні користувачі", "Сеанси"],
+            legend_below=True,
+            connectgaps=True,
+            cache=get_figure_cache(),
         )
-    )
-    fig_combined.update_xaxes(tickmode="linear", tickangle=45)
-    fig_combined.update_traces(connectgaps=True)
-    st.plotly_chart(fig_combined, use_container_width=True)
+        st.plotly_chart(fig_combined, use_container_width=True)
 
     
     # -------------------- Топ-10 найпопулярніших сторінок за переглядами ---------------------
     st.subheader("Топ-10 найпопулярніших сторінок за переглядами")
 
-    # Запит до GA4: топ-10 за кількістю переглядів сторінок
-    pages_request = RunReportRequest(
-        property=f"properties/{PROPERTY_ID}",
-        dimensions=[Dimension(name="pagePath")],
-        metrics=[Metric(name="screenPageViews")],
-        date_ranges=[DateRange(
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )],
-        order_bys=[
-            OrderBy(
-                metric=OrderBy.MetricOrderBy(metric_name="screenPageViews"),
-                desc=True
+    with profiler.span("Графік: Топ-10 найпопулярніших сторінок за переглядами"):
+        # Топ-10 сторінок за кількістю переглядів
+        pages_df = ga4_frames["pages"]
+
+        # Малюємо горизонтальну гістограму топ-10 сторінок
+        def build_pages_chart():
+            import plotly.express as px
+
+            fig = px.bar(
+                pages_df,
+                x="Перегляди",
+                y="Сторінка",
+                orientation="h"
             )
-        ],
-        limit=10
-    )
-    pages_response = client.run_report(pages_request)
-
-    # Перетворюємо відповідь в DataFrame
-    pages_data = []
-    for row in pages_response.rows:
-        path = row.dimension_values[0].value
-        views = int(row.metric_values[0].value)
-        pages_data.append({"Сторінка": path, "Перегляди": views})
-    pages_df = pd.DataFrame(pages_data)
-
-    # Малюємо горизонтальну гістограму топ-10 сторінок
-    fig_pages = px.bar(
-        pages_df,
-        x="Перегляди",
-        y="Сторінка",
-        orientation="h"
-    )
-    fig_pages.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        yaxis=dict(autorange="reversed")  # найпопулярніша зверху
+            fig.update_layout(
+                xaxis_title=None,
+                yaxis_title=None,
+                yaxis=dict(autorange="reversed")  # найпопулярніша зверху
+            )
+            return fig
+
+        fig_pages = cached_figure(get_figure_cache(), pages_df, ("pages_bar",), build_pages_chart)
+        st.plotly_chart(fig_pages, use_container_width=True)
+
+#----------------------------------------------------------------------------
+# 🗂 Вкладки: за замовчуванням виконується лише активна вкладка,
+# і кожна вкладка — окремий фрагмент, тож її віджети перезапускають лише її
+dashboard_tabs = {
+    "Статистика передплат": render_subscriptions,
+    "Порівняння тарифів": render_comparison,
+    "Активність": render_activity,
+    "Застосунок CASES": render_app,
+    "Сайт cases.media": render_site,
+}
+
+if st.secrets.get("lazy_tabs", True):
+    active_tab = st.radio(
+        "Розділ",
+        list(dashboard_tabs),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="active_tab",
     )
-    st.plotly_chart(fig_pages, use_container_width=True)
\ No newline at end of file
+    with profiler.span(f"Вкладка: {active_tab}"):
+        dashboard_tabs[active_tab]()
+else:
+    # Класичний режим: усі вкладки рендеряться на кожному перезапуску
+    for tab, (name, render) in zip(st.tabs(list(dashboard_tabs)), dashboard_tabs.items()):
+        with tab, profiler.span(f"Вкладка: {name}"):
+            render()
+
+# 📉 Квота GA4 Data API за останніми відповідями
+ga4_scheduler = get_ga4_scheduler()
+if ga4_scheduler.quota_updated is not None:
+    with st.sidebar.expander("Квота GA4"):
+        st.dataframe(ga4_scheduler.quota_table(), hide_index=True, use_container_width=True)
+        scheduler_stats = ga4_scheduler.stats()
+        st.caption(
+            f"Оновлено: {ga4_scheduler.quota_updated:%H:%M:%S}; запитів: {scheduler_stats['requests']}, "
+            f"повторів: {scheduler_stats['retries']}, очікування в черзі: {scheduler_stats['throttled_seconds']} с"
+        )
+
+# 🔬 Розбивка часу цього запуску по секціях і файл флеймграфа
+if profiler.enabled:
+    flamegraph_path = profiler.stop()
+    with st.sidebar.expander("Профілювання запуску", expanded=True):
+        show_profile(profiler, flamegraph_path)
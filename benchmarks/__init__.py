@@ -0,0 +1,9 @@
+"""
+Бенчмарки розрахунків дашборда на синтетичних даних.
+
+Запуск з кореня репозиторію:
+
+    python -m benchmarks                    # усі розміри, порівняння з baselines.json
+    python -m benchmarks --sizes 30d-11     # лише один розмір
+    python -m benchmarks --update-baselines # записати поточні часи як еталон
+"""
@@ -0,0 +1,146 @@
+"""
+Запуск бенчмарків: час кожного етапу конвеєра дашборда для кожного розміру
+синтетичних даних і порівняння з еталонними часами з baselines.json.
+
+Етап вважається регресією, якщо він повільніший за еталон більше ніж у
+`--tolerance` разів (і різниця більша за MIN_REGRESSION_SECONDS, щоб шум
+на мікросекундних етапах не ламав перевірку). За наявності регресій
+процес завершується з кодом 1.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import SIZES, stat_frames, tariff_frames, to_csv_bytes
+from cohorts import CohortIndex
+from cube import TariffCube
+from data_loader import parse_csv
+from formatting import comparison_table, ordered_tariffs
+from metrics import comparison_metrics, daily_kpis, daily_metrics, target_metrics
+from range_index import CubeIndex
+from rollups import choose_granularity, rollup_metrics
+from timeseries import StatFrames
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_TOLERANCE = 1.5
+MIN_REGRESSION_SECONDS = 0.005
+AD_BUDGET = 5000
+
+
+def best_of(func, repeat):
+    """Найкращий час із `repeat` запусків (секунди) і результат останнього"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run_pipeline(days, tariffs, repeat):
+    """Час кожного етапу: {етап: секунди}. Період — усі дані, як найгірший випадок"""
+    raw_tariffs = to_csv_bytes(tariff_frames(days, tariffs))
+    raw_stats = stat_frames(days)
+    timings = {}
+
+    def stage(name, func):
+        timings[name], result = best_of(func, repeat)
+        return result
+
+    frames = stage("parse_csv", lambda: {name: parse_csv(content) for name, content in raw_tariffs.items()})
+    cube = stage("build_cube", lambda: TariffCube.from_frames(frames))
+    index = stage("build_index", lambda: CubeIndex(cube))
+    start_date, end_date = cube.data_range()
+
+    granularity = choose_granularity(start_date, end_date)
+
+    stage("daily_metrics", lambda: daily_metrics(cube.window(start_date, end_date)))
+    stage("rollup_metrics", lambda: rollup_metrics(index, cube.tariffs, start_date, end_date, granularity))
+    stage("target_metrics", lambda: target_metrics(index, cube.tariffs, start_date, end_date, AD_BUDGET))
+    comparison = stage("comparison_metrics", lambda: comparison_metrics(index, start_date, end_date, AD_BUDGET))
+    stage("comparison_table", lambda: comparison_table(comparison, ordered_tariffs(cube.tariffs)))
+    stage("daily_kpis", lambda: daily_kpis(cube, AD_BUDGET))
+
+    cohorts = stage("build_cohorts", lambda: CohortIndex(cube))
+    stage("cohort_retention", lambda: cohorts.retention_table(cube.tariffs, start_date, end_date))
+    stage("cohort_ltv", lambda: cohorts.ltv(cube.tariffs, start_date, end_date))
+
+    stats = stage("stat_frames", lambda: StatFrames(raw_stats))
+    stage("stat_slices", lambda: stats.slice_all(start_date, end_date))
+    stage("stat_rollups", lambda: stats.rollup_all(start_date, end_date, granularity))
+    return timings
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baselines, tolerance):
+    """Таблиця етапів з еталоном, відношенням і ознакою регресії"""
+    rows = []
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            baseline = baselines.get(size, {}).get(stage)
+            ratio = seconds / baseline if baseline else None
+            regression = (
+                baseline is not None
+                and seconds > baseline * tolerance
+                and seconds - baseline > MIN_REGRESSION_SECONDS
+            )
+            rows.append({
+                "size": size,
+                "stage": stage,
+                "ms": round(seconds * 1000, 2),
+                "baseline_ms": round(baseline * 1000, 2) if baseline else None,
+                "ratio": round(ratio, 2) if ratio else None,
+                "regression": regression,
+            })
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки розрахунків дашборда")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="скільки разів запускати кожен етап")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="у скільки разів етап може бути повільнішим за еталон")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true", help="записати поточні часи як еталон")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        days, tariffs = SIZES[size]
+        results[size] = run_pipeline(days, tariffs, args.repeat)
+
+    baselines = load_baselines(args.baselines)
+    report = compare(results, baselines, args.tolerance)
+    print(report.to_string(index=False))
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Еталонні часи записано в {args.baselines}")
+        return 0
+
+    regressions = report[report["regression"]]
+    if not regressions.empty:
+        print(f"\nРегресії продуктивності: {len(regressions)}", file=sys.stderr)
+        for row in regressions.itertuples():
+            print(f"  {row.size} / {row.stage}: {row.ms} мс (еталон {row.baseline_ms} мс, ×{row.ratio})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Генератори синтетичних даних у форматі файлів Google Drive дашборда.
+
+- tariff_frames: CSV тарифів (date, start, new, reactivated, upgradedEnter,
+  downgradedEnter, end, upgradedExit, downgradedExit) з узгодженими потоками:
+  end дня = start наступного дня, а Churned Users ≥ 0;
+- stat_frames: ряди статистики (date, total, active) для statistic_files.
+
+Дані детерміновані для заданого seed, тож результати бенчмарків порівнювані.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import FLOW_COLUMNS
+from sources import statistic_files
+
+# Розміри наборів даних: назва -> (днів, тарифів)
+SIZES = {
+    "30d-11": (30, 11),
+    "1y-11": (365, 11),
+    "3y-50": (3 * 365, 50),
+    "10y-200": (10 * 365, 200),
+}
+
+DEFAULT_END = pd.Timestamp("2025-06-30")
+
+
+def tariff_names(count):
+    """Унікальні назви тарифів у форматі дашборда: навпіл «Theory Only» і «Full Access»"""
+    names = []
+    for i in range(count):
+        prefix = "Theory Only" if i % 2 == 0 else "Full Access"
+        names.append(f"{prefix} {(i // 2) * 50}UAH")
+    return names
+
+
+def tariff_frames(days, tariffs, seed=0, end=DEFAULT_END):
+    """
+    {назва тарифу: DataFrame} за `days` днів до `end`. Частина тарифів
+    з'являється пізніше за початок періоду, як нові тарифи в реальних даних.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=days, freq="D")
+    names = tariff_names(tariffs)
+
+    # Перший день кожного тарифу: третина тарифів запускається посеред періоду
+    launch = np.where(rng.random(tariffs) < 1 / 3, rng.integers(0, days, tariffs), 0)
+
+    size = rng.integers(20, 2000, tariffs).astype(float)
+    churn_p = rng.uniform(0.002, 0.02, tariffs)
+    flows = np.zeros((days, tariffs, len(FLOW_COLUMNS)), dtype=np.int64)
+    start = rng.poisson(size).astype(np.int64)
+
+    for day in range(days):
+        new = rng.poisson(size * 0.01)
+        reactivated = rng.poisson(size * 0.002)
+        upgraded_enter = rng.poisson(size * 0.001)
+        downgraded_enter = rng.poisson(size * 0.001)
+        upgraded_exit = rng.binomial(start, 0.001)
+        downgraded_exit = rng.binomial(start - upgraded_exit, 0.001)
+        churn = rng.binomial(start - upgraded_exit - downgraded_exit, churn_p)
+        end_value = (
+            start + new + reactivated + upgraded_enter + downgraded_enter
+            - upgraded_exit - downgraded_exit - churn
+        )
+        flows[day] = np.stack([
+            start, new, reactivated, upgraded_enter, downgraded_enter,
+            end_value, upgraded_exit, downgraded_exit,
+        ], axis=1)
+        start = end_value
+
+    frames = {}
+    for position, name in enumerate(names):
+        first = launch[position]
+        frame = pd.DataFrame(flows[first:, position], columns=FLOW_COLUMNS)
+        frame.insert(0, "date", dates[first:])
+        frames[name] = frame
+    return frames
+
+
+def stat_frames(days, seed=0, end=DEFAULT_END):
+    """{назва файлу статистики: DataFrame з колонками date, total, active}"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=days, freq="D")
+    frames = {}
+    for name in statistic_files:
+        total = rng.integers(100, 5000) + np.cumsum(rng.poisson(3, days))
+        active = np.minimum(total, rng.poisson(total * 0.3))
+        frames[name] = pd.DataFrame({"date": dates, "total": total, "active": active})
+    return frames
+
+
+def to_csv_bytes(frames):
+    """Той самий набір таблиць у вигляді сирого вмісту CSV, як його віддає Drive"""
+    return {
+        name: frame.assign(date=frame["date"].dt.strftime("%Y-%m-%d")).to_csv(index=False).encode()
+        for name, frame in frames.items()
+    }
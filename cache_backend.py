@@ -0,0 +1,275 @@
+"""
+Спільний кеш для кількох процесів сервера Streamlit.
+
+Дашборд може працювати кількома репліками за балансувальником, а
+`st.cache_resource`/`st.cache_data` живуть лише в одному процесі — кожна
+репліка окремо завантажувала б файли Drive і звіти GA4. Тому знімки Drive
+і денний кеш GA4 зберігаються через CacheBackend. Таблиці KPI з префіксних
+сум кожен процес рахує сам: це швидше, ніж читання і розбір Parquet зі
+спільного кешу. CacheBackend — інтерфейс з кількох операцій:
+
+- get(key) / set(key, value, ttl) — байти за ключем з часом життя;
+- set_many(items, ttl) — кілька ключів однією транзакцією (таблиця разом
+  з її метаданими);
+- lock(key) — блокування між процесами (з орендою, щоб блокування процесу,
+  який упав, з часом звільнялося).
+
+SQLiteCacheBackend — реалізація для кількох процесів на одному хості
+(один файл SQLite у режимі WAL; кожен запис — одна транзакція, тож читачі
+бачать або старе, або нове значення — і для set_many теж).
+MemoryCacheBackend — для одного процесу. Мережеве сховище (наприклад, Redis: SET з PX і SET NX для
+блокування) може реалізувати той самий інтерфейс.
+"""
+
+import hashlib
+import io
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import pandas as pd
+
+DEFAULT_PATH = os.path.join(".snapshots", "cache.sqlite")
+
+# Скільки чекати на чуже блокування і скільки воно діє без продовження (секунд)
+LOCK_TIMEOUT = 60
+LOCK_LEASE = 120
+_LOCK_POLL = 0.05
+
+
+def cache_key(*parts):
+    """Короткий стабільний ключ з довільних частин (відбитки, дати, параметри)"""
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:20]
+
+
+def frame_bytes(df):
+    """Таблиця у байтах Parquet — так її зберігають set_frame і set_many"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def json_bytes(data):
+    """JSON у байтах — так його зберігають set_json і set_many"""
+    return json.dumps(data).encode()
+
+
+class CacheBackend(ABC):
+    """
+    Інтерфейс спільного кешу. Реалізації мають забезпечити get, set,
+    set_many, delete і lock; решта методів (таблиці, JSON, get_or_compute)
+    побудована на них.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """Байти за ключем або None, якщо ключа немає або його TTL минув"""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """Атомарно записує байти; ttl — секунд життя (None — без обмеження)"""
+
+    @abstractmethod
+    def set_many(self, items, ttl=None):
+        """
+        Атомарно записує кілька ключів {key: байти} з одним ttl: читачі і
+        процес після збою бачать або всі старі значення, або всі нові.
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        """Видаляє ключ (якщо його немає — нічого не робить)"""
+
+    @abstractmethod
+    def lock(self, key, timeout=LOCK_TIMEOUT, lease=LOCK_LEASE):
+        """
+        Контекстний менеджер блокування `key` між процесами. Піднімає
+        TimeoutError, якщо блокування не вдалося отримати за `timeout` секунд.
+        """
+
+    def get_frame(self, key):
+        raw = self.get(key)
+        return None if raw is None else pd.read_parquet(io.BytesIO(raw))
+
+    def set_frame(self, key, df, ttl=None):
+        self.set(key, frame_bytes(df), ttl)
+
+    def get_json(self, key):
+        raw = self.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set_json(self, key, data, ttl=None):
+        self.set(key, json_bytes(data), ttl)
+
+    def get_or_compute_frame(self, key, compute, ttl=None, timeout=LOCK_TIMEOUT):
+        """
+        Таблиця з кешу або результат compute(), записаний у кеш. Поки один
+        процес рахує, інші чекають на блокування і потім беруть його результат.
+        """
+        df = self.get_frame(key)
+        if df is not None:
+            return df
+        with self.lock(key, timeout=timeout):
+            df = self.get_frame(key)
+            if df is None:
+                df = compute()
+                self.set_frame(key, df, ttl)
+        return df
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Кеш у пам'яті одного процесу (блокування — лише між потоками)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] < time.time()):
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (bytes(value), expires_at)
+
+    def set_many(self, items, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        entries = {key: (bytes(value), expires_at) for key, value in items.items()}
+        with self._lock:
+            self._entries.update(entries)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    @contextmanager
+    def lock(self, key, timeout=LOCK_TIMEOUT, lease=LOCK_LEASE):
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        if not key_lock.acquire(timeout=timeout):
+            raise TimeoutError(f"Не вдалося отримати блокування кешу за {timeout} с: {key}")
+        try:
+            yield
+        finally:
+            key_lock.release()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Кеш в одному файлі SQLite, спільний для всіх процесів хоста.
+
+    Кожен потік має власне з'єднання. Блокування — рядок у таблиці locks з
+    власником і часом закінчення оренди: захоплення — одна транзакція
+    «видалити прострочене, вставити, якщо немає».
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS locks "
+            "(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.purge()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # autocommit: кожен оператор — окрема транзакція, явні — через BEGIN
+            db = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        db = self._db()
+        row = db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), expires_at),
+        )
+
+    def set_many(self, items, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, sqlite3.Binary(value), expires_at) for key, value in items.items()],
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def delete(self, key):
+        db = self._db()
+        db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def purge(self):
+        """Видаляє записи з минулим TTL і прострочені блокування"""
+        now = time.time()
+        db = self._db()
+        db.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        db.execute("DELETE FROM locks WHERE expires_at < ?", (now,))
+
+    def _try_acquire(self, key, owner, lease):
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM locks WHERE key = ? AND expires_at < ?", (key, now))
+            acquired = db.execute(
+                "INSERT OR IGNORE INTO locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + lease),
+            ).rowcount == 1
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return acquired
+
+    @contextmanager
+    def lock(self, key, timeout=LOCK_TIMEOUT, lease=LOCK_LEASE):
+        owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        delay = _LOCK_POLL
+        while not self._try_acquire(key, owner, lease):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Не вдалося отримати блокування кешу за {timeout} с: {key}")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        try:
+            yield
+        finally:
+            db = self._db()
+            db.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
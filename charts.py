@@ -0,0 +1,274 @@
+"""
+Спільний шлях побудови часових графіків дашборда.
+
+На довгих періодах («Весь час») кожен графік надсилав у браузер усі денні
+точки з маркерами і по мітці осі на кожен день. Тут:
+
+- довгі ряди проріджуються алгоритмом LTTB (Largest-Triangle-Three-Buckets),
+  який зберігає форму кривої — піки і провали, — до бюджету точок, що
+  залежить від ширини графіка на екрані;
+- крок міток осі дат підбирається за довжиною періоду (дні, тижні, місяці, роки);
+- маркери малюються лише на коротких рядах, а великі графіки рендеряться
+  через WebGL (Scattergl).
+
+Тож розмір графіка і час рендеру в браузері більше не ростуть разом з історією.
+
+Готові фігури кешуються (FigureCache) за відбитком вхідної таблиці і
+параметрами графіка: якщо дані не змінилися (перемикання вкладки, інший
+віджет), побудова через Plotly Express пропускається. Так само кешується
+теплова карта heatmap() (утримання когорт).
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Орієнтовна ширина графіка на всю ширину сторінки (layout="wide") і скільки точок на піксель
+CHART_WIDTH_PX = 1400
+POINTS_PER_PX = 1.0
+
+# Після скількох точок (усіх рядів разом) перемикатися на WebGL
+WEBGL_THRESHOLD = 1000
+
+# Маркери на кожній точці — лише для коротких рядів
+MARKERS_MAX_POINTS = 120
+
+# Скільки міток осі дат помістити на графік на всю ширину
+MAX_TICKS = 20
+
+# Можливі кроки міток: дні, потім місяці
+_DAY_STEPS = [1, 2, 7, 14]
+_MONTH_STEPS = [1, 2, 3, 6, 12, 24, 60]
+
+# Скільки готових фігур тримати в кеші
+DEFAULT_FIGURE_CACHE_SIZE = 64
+
+# Теплова карта: висота рядка і межі висоти графіка (пікселів), підписи в клітинках — лише для невеликих карт
+HEATMAP_ROW_PX = 24
+HEATMAP_MIN_HEIGHT = 300
+HEATMAP_MAX_HEIGHT = 900
+HEATMAP_TEXT_MAX_CELLS = 600
+
+LEGEND_BELOW = dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5, title=None)
+
+
+class FigureCache:
+    """
+    Обмежений LRU-кеш готових фігур Plotly: ключ — відбиток вхідної таблиці
+    і опис графіка. Фігури з кешу спільні для всіх сесій, тож після побудови
+    їх не можна змінювати (усе, що додається до фігури, має бути в описі).
+    """
+
+    def __init__(self, max_entries=DEFAULT_FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key]
+            self.misses += 1
+        figure = build()
+        with self._lock:
+            self._figures[key] = figure
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return figure
+
+    def stats(self):
+        """Лічильники влучань і промахів та кількість фігур у кеші"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._figures)}
+
+
+def data_fingerprint(df):
+    """Дешевий відбиток таблиці: колонки, кількість рядків і хеш значень"""
+    return (
+        tuple(df.columns),
+        len(df),
+        int(pd.util.hash_pandas_object(df, index=False).sum()),
+    )
+
+
+def cached_figure(cache, df, spec, build):
+    """
+    Фігура з кешу за (відбиток df, spec) або результат build(); без кешу
+    (cache=None) — просто build(). `spec` — хешований опис графіка.
+    """
+    if cache is None:
+        return build()
+    return cache.get_or_build((data_fingerprint(df), spec), build)
+
+
+def point_budget(width=1.0):
+    """Скільки точок має сенс показувати на графіку шириною `width` від сторінки"""
+    return max(int(CHART_WIDTH_PX * width * POINTS_PER_PX), 3)
+
+
+def lttb(x, y, threshold):
+    """
+    Індекси точок, які залишає LTTB при проріджуванні ряду до `threshold` точок.
+    Перша й остання точки завжди зберігаються.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+
+    for i in range(threshold - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+
+        # Вершина трикутника в наступному кошику — середня точка кошика
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Точка поточного кошика з найбільшою площею трикутника
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def downsample(df, x, y_columns, max_points):
+    """
+    Проріджує таблицю до ~max_points рядків: LTTB окремо для кожного ряду,
+    у результаті — об'єднання відібраних рядків (форма кожного ряду зберігається).
+    Порожні значення (NaN) у виборі точок не беруть участі.
+    """
+    if len(df) <= max_points:
+        return df
+
+    x_values = pd.to_datetime(df[x]).to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    keep = np.zeros(len(df), dtype=bool)
+    for column in y_columns:
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+        finite = np.flatnonzero(np.isfinite(values))
+        keep[finite[lttb(x_values[finite], values[finite], max_points)]] = True
+    return df.iloc[np.flatnonzero(keep)]
+
+
+def date_ticks(dates, width=1.0):
+    """
+    Параметри осі дат: крок міток підбирається так, щоб на графіку було
+    не більше ~MAX_TICKS * width міток (1 день, 2 дні, тиждень, ..., рік, 5 років).
+    """
+    dates = pd.to_datetime(pd.Series(dates)).dropna()
+    if dates.empty:
+        return {}
+    first, last = dates.min().normalize(), dates.max().normalize()
+    days = max((last - first).days, 1)
+    max_ticks = max(int(MAX_TICKS * width), 4)
+
+    for step in _DAY_STEPS:
+        if days / step <= max_ticks:
+            return dict(tickmode="linear", tick0=first.strftime("%Y-%m-%d"), dtick=step * 24 * 60 * 60 * 1000)
+
+    months = days / 30.4
+    for step in _MONTH_STEPS:
+        if months / step <= max_ticks or step == _MONTH_STEPS[-1]:
+            return dict(tickmode="linear", tick0=first.replace(day=1).strftime("%Y-%m-%d"), dtick=f"M{step}")
+
+
+def line_chart(df, x, y, width=1.0, legend_below=False, showlegend=None, connectgaps=False,
+               hline=None, cache=None):
+    """
+    Лінійний графік часового ряду з проріджуванням, адаптивними мітками
+    осі дат і WebGL для великих графіків.
+
+    - width: частка ширини сторінки, яку займає графік (0.5 — у колонці з двох);
+    - legend_below: горизонтальна легенда під графіком;
+    - connectgaps: з'єднувати лінію через пропущені дні;
+    - hline: параметри fig.add_hline (наприклад, лінія медіани);
+    - cache: FigureCache для повторного використання готової фігури.
+    """
+    y_columns = [y] if isinstance(y, str) else list(y)
+    spec = (
+        "line", x, tuple(y_columns), width, legend_below, showlegend, connectgaps,
+        tuple(sorted(hline.items())) if hline else None,
+    )
+
+    def build():
+        import plotly.express as px  # важкий модуль — лише коли графік справді будується
+
+        data = downsample(df, x, y_columns, point_budget(width))
+        points = len(data) * len(y_columns)
+
+        fig = px.line(
+            data,
+            x=x,
+            y=y,
+            markers=len(data) <= MARKERS_MAX_POINTS,
+            render_mode="webgl" if points > WEBGL_THRESHOLD else "svg",
+        )
+
+        layout = dict(xaxis_title=None, yaxis_title=None)
+        if legend_below:
+            layout["legend"] = LEGEND_BELOW
+        if showlegend is not None:
+            layout["showlegend"] = showlegend
+        fig.update_layout(**layout)
+        fig.update_xaxes(tickangle=45, **date_ticks(data[x], width))
+        if connectgaps:
+            fig.update_traces(connectgaps=True)
+        if hline:
+            fig.add_hline(**hline)
+        return fig
+
+    return cached_figure(cache, df, spec, build)
+
+
+def heatmap(df, x_title=None, y_title=None, percent=True, cache=None):
+    """
+    Теплова карта таблиці: рядки — індекс df (зверху вниз), колонки — вісь x.
+
+    - x_title, y_title: підписи осей (і підказки при наведенні);
+    - percent: значення — частки від 0 до 1, показуються у відсотках;
+    - cache: FigureCache для повторного використання готової фігури.
+    """
+    spec = ("heatmap", x_title, y_title, percent)
+
+    def build():
+        import plotly.graph_objects as go  # важкий модуль — лише коли графік справді будується
+
+        values = df.to_numpy(dtype=float)
+        value_format = ".0%" if percent else ",.0f"
+        fig = go.Figure(go.Heatmap(
+            z=values,
+            x=[str(column) for column in df.columns],
+            y=[str(label) for label in df.index],
+            colorscale="Blues",
+            zmin=0,
+            zmax=1 if percent else None,
+            texttemplate=f"%{{z:{value_format}}}" if values.size <= HEATMAP_TEXT_MAX_CELLS else None,
+            hovertemplate=f"{y_title}: %{{y}}<br>{x_title}: %{{x}}<br>%{{z:{value_format}}}<extra></extra>",
+            colorbar=dict(tickformat=value_format),
+        ))
+        height = min(max(len(df) * HEATMAP_ROW_PX + 120, HEATMAP_MIN_HEIGHT), HEATMAP_MAX_HEIGHT)
+        fig.update_layout(xaxis_title=x_title, yaxis_title=y_title, height=height)
+        fig.update_xaxes(type="category", side="top")
+        fig.update_yaxes(type="category", autorange="reversed")
+        return fig
+
+    # Підписи рядків теж входять у відбиток, тож кеш не сплутає когорти з однаковими значеннями
+    return cached_figure(cache, df.reset_index(), spec, build)
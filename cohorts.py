@@ -0,0 +1,165 @@
+"""
+Когорти передплатників: місяць залучення × місяців від залучення.
+
+У CSV тарифів є лише денні потоки без ідентифікаторів користувачів, тож
+утримання когорт моделюється з потоків. Для кожного тарифу і календарного
+місяця рахується частка передплатників, що протрималися місяць: денні
+частки Churned Users від start + входів переводяться в утримання за
+повний календарний місяць (так само для неповних місяців на краях даних).
+Когорта, залучена в місяці c (new + reactivated), у віці k утримує добуток
+цих часток за місяці c+1 … c+k.
+
+CohortIndex будує масиви для всіх тарифів одразу (когорти × вік × тарифи)
+один раз на відбиток даних. Вибір тарифів і періоду — це зріз масивів і
+зважена за розміром когорт сума, без циклів по тарифах чи когортах.
+Утримання когорт, залучених у вибраному періоді, показується до останнього
+місяця з даними.
+
+Cohort LTV — очікувана виручка на одного залученого: сума утримання за
+спостережені місяці плюс геометричний хвіст після кінця даних (з
+утриманням тарифу за останні TAIL_MONTHS місяців), × ціна тарифу.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import FLOW_COLUMNS
+from metrics import ENTER_COLUMNS, NEW, REACTIVATED, churned
+
+# За скільки останніх місяців даних оцінюється утримання після кінця даних (хвіст LTV)
+TAIL_MONTHS = 3
+
+# Найбільше місячне утримання в хвості LTV: обмежує очікуваний хвіст 99 місяцями
+MAX_TAIL_SURVIVAL = 0.99
+
+_ENTER = [FLOW_COLUMNS.index(col) for col in ENTER_COLUMNS]
+
+
+def _month_sum(values, first_days):
+    """Суми масиву (дні × ...) по календарних місяцях; first_days — перший день кожного місяця"""
+    if not len(first_days):
+        return np.zeros((0,) + values.shape[1:])
+    return np.add.reduceat(values, first_days, axis=0)
+
+
+def month_survival(cube, first_days, months):
+    """
+    Частка передплатників кожного тарифу, що протрималися календарний місяць
+    (місяці × тарифи). Денні утримання 1 − Churned Users / (start + входи)
+    усереднюються в логарифмах по днях з даними і масштабуються на довжину
+    місяця; місяці без жодного такого дня — NaN.
+    """
+    values = cube.values
+    exposure = values[..., _ENTER].sum(axis=-1)
+    valid = cube.present & (exposure > 0)
+    hazard = np.divide(np.clip(churned(values), 0, None), exposure, out=np.zeros_like(exposure), where=valid)
+    with np.errstate(divide="ignore"):
+        log_survival = np.log1p(-np.minimum(hazard, 1))
+
+    log_sum = _month_sum(log_survival, first_days)
+    days = _month_sum(valid.astype(float), first_days)
+    month_days = (months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_log = np.where(days > 0, log_sum / days, np.nan)
+        return np.exp(mean_log * month_days.astype(float)[:, None])
+
+
+def retention_curves(survival):
+    """
+    Утримання кожної когорти (когорти × вік × тарифи): вік 0 — місяць
+    залучення (1), далі — добуток місячного утримання тарифу; вік за
+    останнім місяцем даних — NaN.
+    """
+    count = len(survival)
+    month = np.arange(count)[:, None] + np.arange(count)[None, :]
+    factors = survival[np.minimum(month, count - 1)]
+    factors[:, :1] = 1.0
+    factors[month >= count] = np.nan
+    return np.cumprod(factors, axis=1)
+
+
+def tail_survival(survival, months=TAIL_MONTHS):
+    """Місячне утримання кожного тарифу після кінця даних: середнє геометричне за останні `months` місяців"""
+    recent = survival[-months:]
+    finite = np.isfinite(recent)
+    with np.errstate(divide="ignore"):
+        logs = np.where(finite, np.log(np.where(finite, recent, 1)), 0).sum(axis=0)
+    count = finite.sum(axis=0)
+    mean_log = np.divide(logs, count, out=np.full(len(count), -np.inf), where=count > 0)
+    return np.minimum(np.exp(mean_log), MAX_TAIL_SURVIVAL)
+
+
+class CohortIndex:
+    """
+    Когорти всіх тарифів TariffCube:
+    - months: початки календарних місяців даних (місяці залучення)
+    - survival: місячне утримання (місяці × тарифи)
+    - acquired: залучено за місяць, new + reactivated (місяці × тарифи)
+    - retention: утримання когорт (когорти × вік × тарифи)
+    - lifetime: очікувана кількість оплачених місяців на одного залученого
+      з урахуванням хвоста після кінця даних (когорти × тарифи)
+    """
+
+    def __init__(self, cube):
+        self.cube = cube
+        day_months = cube.dates.to_numpy().astype("datetime64[M]")
+        first_days = np.flatnonzero(np.r_[True, day_months[1:] != day_months[:-1]]) if len(day_months) else []
+        months = day_months[first_days]
+        self.months = pd.DatetimeIndex(months.astype("datetime64[ns]"))
+
+        self.survival = month_survival(cube, first_days, months)
+        self.acquired = _month_sum(cube.values[..., NEW] + cube.values[..., REACTIVATED], first_days)
+        self.retention = retention_curves(self.survival)
+
+        # Утримання в останньому спостереженому віці кожної когорти — початок хвоста
+        count = len(months)
+        last = np.nan_to_num(self.retention[np.arange(count), count - 1 - np.arange(count)])
+        tail = tail_survival(self.survival)
+        self.lifetime = np.nansum(self.retention, axis=1) + last * (tail / (1 - tail))
+
+    def _slice(self, tariffs, start_date, end_date):
+        """Позиції тарифів і межі [first, last) місяців залучення для періоду"""
+        positions = [self.cube.tariffs.index(name) for name in tariffs if name in self.cube.tariffs]
+        if not len(self.months):
+            return positions, 0, 0
+        origin = self.months[0].year * 12 + self.months[0].month
+        first = pd.Timestamp(start_date).year * 12 + pd.Timestamp(start_date).month - origin
+        last = pd.Timestamp(end_date).year * 12 + pd.Timestamp(end_date).month - origin + 1
+        first = min(max(first, 0), len(self.months))
+        last = min(max(last, first), len(self.months))
+        return positions, first, last
+
+    def retention_table(self, tariffs, start_date, end_date):
+        """
+        Утримання вибраних тарифів разом для когорт, залучених у місяці
+        періоду: рядки — місяць залучення, колонка users — розмір когорти,
+        колонки 0, 1, 2, … — частка когорти через стільки місяців. Когорти
+        без залучених пропускаються.
+        """
+        positions, first, last = self._slice(tariffs, start_date, end_date)
+        acquired = self.acquired[first:last][:, positions]
+        retention = self.retention[first:last, :len(self.months) - first][:, :, positions]
+
+        observed = np.isfinite(retention)
+        retained = np.einsum("ct,ckt->ck", acquired, np.where(observed, retention, 0))
+        weight = np.einsum("ct,ckt->ck", acquired, observed.astype(float))
+        rate = np.divide(retained, weight, out=np.full(retained.shape, np.nan), where=weight > 0)
+
+        users = acquired.sum(axis=1)
+        table = pd.DataFrame(rate, index=self.months[first:last].rename("cohort"), columns=range(rate.shape[1]))
+        table.insert(0, "users", users.astype(int))
+        return table[users > 0]
+
+    def ltv(self, tariffs, start_date, end_date):
+        """
+        Cohort LTV вибраних тарифів: очікувана виручка на одного залученого
+        в місяцях періоду (середнє, зважене за розміром когорт), або None,
+        якщо в періоді нікого не залучено.
+        """
+        positions, first, last = self._slice(tariffs, start_date, end_date)
+        acquired = self.acquired[first:last][:, positions]
+        total = acquired.sum()
+        if not total:
+            return None
+        months_paid = (acquired * self.lifetime[first:last][:, positions]).sum(axis=0)
+        return float(months_paid @ self.cube.prices[positions] / total)
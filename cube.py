@@ -0,0 +1,152 @@
+"""
+Щільний куб даних тарифів: день × тариф × показник.
+
+Куб будується один раз з усіх завантажених CSV тарифів і є спільним джерелом
+даних для вкладок «Статистика передплат» і «Порівняння тарифів»: вкладки
+беруть з нього зрізи за тарифами і періодом замість того, щоб заново
+об'єднувати та фільтрувати таблиці.
+"""
+
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Колонки потоків передплат у CSV тарифів
+FLOW_COLUMNS = [
+    "start", "new", "reactivated",
+    "upgradedEnter", "downgradedEnter",
+    "end", "upgradedExit", "downgradedExit"
+]
+
+# Групи тарифів за префіксом назви
+TARIFF_GROUPS = {
+    "Theory Only": "Лише теорія",
+    "Full Access": "Повний доступ",
+}
+
+
+def tariff_price(tariff_name):
+    """Ціна тарифу, витягнута з назви ("Full Access 250UAH" -> 250), або 0"""
+    match = re.search(r"(\d+)UAH", tariff_name)
+    return int(match.group(1)) if match else 0
+
+
+def tariff_group(tariff_name):
+    """Назва групи тарифу ("Лише теорія" / "Повний доступ") або порожній рядок"""
+    for prefix, group in TARIFF_GROUPS.items():
+        if tariff_name.startswith(prefix):
+            return group
+    return ""
+
+
+@dataclass
+class TariffCube:
+    """
+    Дані тарифів у вигляді масивів:
+    - dates: усі календарні дні підряд (вісь 0)
+    - tariffs: назви тарифів (вісь 1)
+    - values: масив (дні × тарифи × FLOW_COLUMNS); дні без рядка в CSV = 0
+    - present: чи є рядок тарифу на цей день (дні × тарифи)
+    - prices, groups: ціна і група кожного тарифу
+
+    Зрізи window() — це представлення (view) без копіювання даних.
+    """
+    dates: pd.DatetimeIndex
+    tariffs: list
+    values: np.ndarray
+    present: np.ndarray
+    prices: np.ndarray
+    groups: np.ndarray
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Будує куб з {назва тарифу: DataFrame з колонкою date і потоками}"""
+        tariffs = list(frames)
+        if not tariffs:
+            return cls.empty()
+
+        long = pd.concat(
+            [frame.assign(tariff_name=name) for name, frame in frames.items()],
+            ignore_index=True,
+        )
+        for col in FLOW_COLUMNS:
+            long[col] = pd.to_numeric(long.get(col, 0), errors="coerce").fillna(0)
+        grouped = long.groupby(["date", "tariff_name"])[FLOW_COLUMNS].sum()
+
+        row_dates = grouped.index.get_level_values("date")
+        dates = pd.date_range(row_dates.min(), row_dates.max(), freq="D")
+        date_pos = (row_dates - dates[0]).days.to_numpy()
+        tariff_pos = pd.Index(tariffs).get_indexer(grouped.index.get_level_values("tariff_name"))
+
+        values = np.zeros((len(dates), len(tariffs), len(FLOW_COLUMNS)))
+        values[date_pos, tariff_pos] = grouped.to_numpy(dtype=float)
+        present = np.zeros((len(dates), len(tariffs)), dtype=bool)
+        present[date_pos, tariff_pos] = True
+
+        return cls(
+            dates=dates,
+            tariffs=tariffs,
+            values=values,
+            present=present,
+            prices=np.array([tariff_price(name) for name in tariffs], dtype=float),
+            groups=np.array([tariff_group(name) for name in tariffs], dtype=object),
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            dates=pd.DatetimeIndex([]),
+            tariffs=[],
+            values=np.zeros((0, 0, len(FLOW_COLUMNS))),
+            present=np.zeros((0, 0), dtype=bool),
+            prices=np.zeros(0),
+            groups=np.array([], dtype=object),
+        )
+
+    def flow(self, column):
+        """Масив дні × тарифи для одного показника з FLOW_COLUMNS"""
+        return self.values[:, :, FLOW_COLUMNS.index(column)]
+
+    def day_index(self, day):
+        """Позиція дня в кубі або None, якщо день поза межами куба"""
+        if not len(self.dates):
+            return None
+        position = (pd.Timestamp(day) - self.dates[0]).days
+        return position if 0 <= position < len(self.dates) else None
+
+    def data_range(self):
+        """Перший і останній день, для якого є хоча б один рядок даних"""
+        days = np.flatnonzero(self.present.any(axis=1))
+        if not len(days):
+            return None, None
+        return self.dates[days[0]], self.dates[days[-1]]
+
+    def select(self, tariffs):
+        """Підкуб з вибраними тарифами (у порядку `tariffs`, відсутні пропускаються)"""
+        positions = [self.tariffs.index(name) for name in tariffs if name in self.tariffs]
+        return TariffCube(
+            dates=self.dates,
+            tariffs=[self.tariffs[i] for i in positions],
+            values=self.values[:, positions],
+            present=self.present[:, positions],
+            prices=self.prices[positions],
+            groups=self.groups[positions],
+        )
+
+    def window(self, start_date, end_date):
+        """Підкуб за днями [start_date, end_date] без копіювання масивів"""
+        if not len(self.dates):
+            return self
+        first = max((pd.Timestamp(start_date) - self.dates[0]).days, 0)
+        last = min((pd.Timestamp(end_date) - self.dates[0]).days + 1, len(self.dates))
+        last = max(last, first)
+        return TariffCube(
+            dates=self.dates[first:last],
+            tariffs=self.tariffs,
+            values=self.values[first:last],
+            present=self.present[first:last],
+            prices=self.prices,
+            groups=self.groups,
+        )
@@ -0,0 +1,139 @@
+"""
+Паралельне завантаження CSV-файлів з Google Drive.
+
+Усі тарифи та файли статистики завантажуються одночасно на обмеженому пулі
+потоків, тож час одного перезапуску дашборда визначається найповільнішим
+файлом, а не сумою всіх завантажень.
+"""
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import pandas as pd
+import requests
+
+DRIVE_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+
+# Скільки файлів завантажуємо одночасно і скільки чекаємо на один файл (сек.)
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 20
+
+
+def drive_url(file_id):
+    """Повертає посилання для прямого завантаження файлу з Google Drive"""
+    return DRIVE_URL.format(file_id=file_id)
+
+
+def parse_dates(df):
+    """Перетворює колонку date, відкидає рядки без дати і сортує за датою"""
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    df = df.dropna(subset=["date"])
+    return df.sort_values("date").reset_index(drop=True)
+
+
+def fetch_bytes(file_id, timeout=DEFAULT_TIMEOUT):
+    """Завантажує сирий вміст файлу з Google Drive"""
+    response = requests.get(drive_url(file_id), timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def fetch_byte_range(file_id, start, timeout=DEFAULT_TIMEOUT):
+    """
+    Завантажує вміст файлу з Google Drive, починаючи з байта `start` (HTTP Range).
+
+    Повертає (content, partial): partial=True, якщо сервер віддав лише хвіст
+    файлу (206), і False, якщо Range не підтримується і прийшов увесь файл (200).
+    Якщо `start` за межами файлу (416 — файл став коротшим), повертає (None, True).
+    """
+    response = requests.get(drive_url(file_id), headers={"Range": f"bytes={start}-"}, timeout=timeout)
+    if response.status_code == 416:
+        return None, True
+    response.raise_for_status()
+    return response.content, response.status_code == 206
+
+
+def parse_csv(content):
+    """Розбирає вміст CSV у DataFrame з перетвореною датою"""
+    return parse_dates(pd.read_csv(io.BytesIO(content)))
+
+
+def fetch_csv(file_id, timeout=DEFAULT_TIMEOUT):
+    """Завантажує один CSV з Google Drive і повертає DataFrame з розібраною датою"""
+    return parse_csv(fetch_bytes(file_id, timeout))
+
+
+@dataclass
+class LoadResult:
+    """
+    Результат паралельного завантаження:
+    - frames: успішно завантажені таблиці за ключем джерела
+    - errors: текст помилки для файлів, які не вдалося завантажити
+    - latencies: час завантаження кожного файлу в секундах
+    """
+    frames: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    latencies: dict = field(default_factory=dict)
+
+    def latency_table(self):
+        """Таблиця часу завантаження по файлах (найповільніші зверху)"""
+        rows = [
+            {
+                "Файл": str(key),
+                "Час, с": round(seconds, 2),
+                "Статус": "помилка" if key in self.errors else "ok",
+            }
+            for key, seconds in self.latencies.items()
+        ]
+        return pd.DataFrame(rows, columns=["Файл", "Час, с", "Статус"]).sort_values(
+            "Час, с", ascending=False
+        )
+
+
+def _timed_fetch(fetch, file_id, timeout):
+    started = time.perf_counter()
+    try:
+        return fetch(file_id, timeout), None, time.perf_counter() - started
+    except Exception as e:
+        return None, e, time.perf_counter() - started
+
+
+def load_datasets(sources, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, fetch=fetch_csv):
+    """
+    Завантажує всі файли з `sources` ({ключ: file_id}) одночасно.
+
+    Помилка або таймаут одного файлу не зупиняє решту: такий файл потрапляє
+    в `errors`, а всі інші — у `frames`.
+    """
+    result = LoadResult()
+    if not sources:
+        return result
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(sources)))
+    started = time.perf_counter()
+    futures = {
+        pool.submit(_timed_fetch, fetch, file_id, timeout): key
+        for key, file_id in sources.items()
+    }
+    # Загальний дедлайн на випадок, якщо з'єднання зависло попри таймаут сокета
+    done, not_done = wait(futures, timeout=timeout * 2)
+
+    for future in done:
+        key = futures[future]
+        df, error, seconds = future.result()
+        result.latencies[key] = seconds
+        if error is not None:
+            result.errors[key] = str(error)
+        else:
+            result.frames[key] = df
+
+    for future in not_done:
+        key = futures[future]
+        result.latencies[key] = time.perf_counter() - started
+        result.errors[key] = f"перевищено час очікування ({timeout * 2} с)"
+
+    # Не чекаємо завислі потоки — вони завершаться самі після таймауту сокета
+    pool.shutdown(wait=False, cancel_futures=True)
+    return result
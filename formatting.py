@@ -0,0 +1,129 @@
+"""
+Форматування чисел у стилі UA і таблиця порівняння тарифів.
+
+Таблиця порівняння будується як числова матриця показники × тарифи, яку
+форматує векторизований format_ua_array, і виводиться через st.dataframe.
+
+Модуль не залежить від Streamlit, тож ті самі функції використовують
+і дашборд, і бенчмарки.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import tariff_group
+
+
+def format_number(val):
+    """
+    Форматує числа у стилі UA:
+    - цілі: розділяє тисячі пробілом (12 345 678)
+    - дробові: розділяє тисячі пробілом і використовує кому як десятковий роздільник (12 345 678,90)
+    """
+    # ціле число
+    if isinstance(val, (int, np.integer)):
+        s = f"{val:,}"            # '12,345,678'
+        return s.replace(",", " ")  # '12 345 678'
+
+    # число з плаваючою крапкою
+    elif isinstance(val, (float, np.floating)):
+        s = f"{val:,.2f}"         # '12,345,678.90'
+        s = s.replace(",", " ")   # '12 345 678.90'
+        return s.replace(".", ",")  # '12 345 678,90'
+
+    # рядок із десятковим роздільником у вигляді крапки
+    elif isinstance(val, str):
+        # замінюємо крапку на кому
+        return val.replace(".", ",")
+
+    # усе інше повертаємо без змін
+    return val
+
+
+# Показники таблиці порівняння: назва рядка -> (колонка comparison_metrics, знаків після коми, у відсотках)
+# Цілі показники (0 знаків, не відсотки) виводяться з розділенням тисяч пробілом
+COMPARISON_FORMATS = {
+    "Користувачів на початок періоду": ("start", None, False),
+    "Користувачів на кінець періоду": ("end", None, False),
+    "Нові користувачі": ("new", None, False),
+    "Реактивовані користувачі": ("reactivated", None, False),
+    "Churned users": ("churned", None, False),
+    "MRR": ("mrr", None, False),
+    "Churn rate": ("churn_rate", 1, True),
+    "Lifetime (міс.)": ("lifetime", 1, False),
+    "ARPPU": ("arppu", 0, False),
+    "LTV": ("ltv", 0, False),
+    "CAC": ("cac", 2, False),
+    "LTV / CAC": ("ltv_cac", 2, False),
+}
+
+# Тимчасово приховані рядки таблиці
+HIDDEN_METRICS = ["CAC", "LTV / CAC"]
+
+# Розділювач між групою тарифу і ціною в заголовку колонки
+GROUP_SEPARATOR = " · "
+
+
+def ordered_tariffs(tariff_names):
+    """Спочатку тарифи «Лише теорія», потім «Повний доступ»"""
+    theory_tariffs = [name for name in tariff_names if "Theory Only" in name]
+    full_tariffs = [name for name in tariff_names if "Full Access" in name]
+    return theory_tariffs + full_tariffs
+
+
+def format_ua_array(values, decimals=None, percent=False):
+    """
+    Форматує цілий масив чисел у стилі UA одним проходом:
+    - decimals=None: цілі з розділенням тисяч пробілом (12 345 678);
+    - інакше: фіксована кількість знаків і кома як десятковий роздільник
+      (12345,7; з percent=True значення множиться на 100 і додається «%»).
+    Порожні значення (NaN) стають «—».
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    filled = np.where(missing, 0, values)
+
+    if decimals is None:
+        text = pd.Series(np.trunc(filled).astype(np.int64).astype(str))
+        text = text.str.replace(r"\B(?=(\d{3})+(?!\d))", " ", regex=True)
+    else:
+        scaled = filled * 100 if percent else filled
+        text = pd.Series(np.char.mod(f"%.{decimals}f", scaled)).str.replace(".", ",", regex=False)
+        if percent:
+            text = text + "%"
+
+    return np.where(missing, "—", text.to_numpy(dtype=object))
+
+
+def comparison_columns(tariffs):
+    """Заголовки колонок: «Лише теорія · 250 грн», «Повний доступ · 0 грн» тощо"""
+    return [
+        tariff_group(name)
+        + GROUP_SEPARATOR
+        + name.replace("Theory Only ", "").replace("Full Access ", "").replace("UAH", " грн")
+        for name in tariffs
+    ]
+
+
+def comparison_matrix(comparison, tariffs):
+    """
+    Типізована матриця показники × тарифи (float64) з результату
+    comparison_metrics — одним зрізом, без прихованих рядків.
+    """
+    rows = [name for name in COMPARISON_FORMATS if name not in HIDDEN_METRICS]
+    columns = [COMPARISON_FORMATS[name][0] for name in rows]
+    values = comparison.reindex(tariffs)[columns].to_numpy(dtype=float).T
+    return pd.DataFrame(values, index=rows, columns=comparison_columns(tariffs))
+
+
+def comparison_table(comparison, tariffs):
+    """
+    Таблиця порівняння для st.dataframe: рядки — показники, колонки — тарифи
+    (група · ціна), значення відформатовані у стилі UA по рядку за раз.
+    """
+    matrix = comparison_matrix(comparison, tariffs)
+    formatted = [
+        format_ua_array(row, *COMPARISON_FORMATS[name][1:])
+        for name, row in zip(matrix.index, matrix.to_numpy())
+    ]
+    return pd.DataFrame(formatted, index=matrix.index, columns=matrix.columns)
@@ -0,0 +1,133 @@
+"""
+Подобовий кеш результатів GA4.
+
+Денні цифри GA4 старші за ~72 години вже не змінюються, тому рядки звітів
+з виміром date зберігаються окремо для кожного дня (ключ — звіт з його
+метриками й фільтрами плюс дата). До GA4 йдуть лише ті дні, яких немає в кеші,
+та останні «невстояні» дні, а потрібний період збирається локально.
+"""
+
+import hashlib
+import io
+import json
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+from cache_backend import MemoryCacheBackend, frame_bytes, json_bytes
+
+# Дні, новіші за цей проміжок, ще можуть змінитися і завжди запитуються заново
+SETTLE_DAYS = 3
+
+# Скільки тримати результати звітів без виміру date (топ сторінок) за встояні періоди
+RANGE_TTL = 30 * 24 * 60 * 60  # секунд
+
+# ... і за періоди з невстояними днями: недовго, щоб сесії між фоновими оновленнями не запитували GA4 щоразу
+RECENT_RANGE_TTL = 15 * 60  # секунд
+
+
+def report_key(request):
+    """Ключ звіту без періоду: виміри, метрики, фільтри, сортування і ліміт"""
+    spec = type(request).to_dict(request)
+    spec.pop("date_ranges", None)
+    spec.pop("property", None)
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def settled_before(today=None):
+    """Перший день, дані за який ще можуть змінитися"""
+    return (today or date.today()) - timedelta(days=SETTLE_DAYS)
+
+
+class DailyReportCache:
+    """
+    Кеш рядків звітів GA4 по днях.
+
+    Для кожного ключа звіту зберігається таблиця рядків (з колонкою date)
+    і множина днів, для яких результат уже відомий — у тому числі порожній,
+    щоб дні без подій не запитувалися повторно.
+
+    Дані лежать у CacheBackend (за замовчуванням — у пам'яті процесу), тож зі
+    спільним бекендом усі репліки бачать дні, які завантажила будь-яка з них.
+    Запис — під блокуванням звіту: прочитати, додати дні, записати.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCacheBackend()
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _load(self, key):
+        """(рядки або None, множина покритих днів) з бекенда"""
+        raw = self.backend.get(f"ga4:{key}:rows")
+        covered = self.backend.get_json(f"ga4:{key}:covered")
+        if raw is None or covered is None:
+            return None, set()
+        with self._lock:
+            # Розібрана таблиця береться з пам'яті, поки байти в бекенді не змінилися
+            cached = self._frames.get(key)
+            if cached is None or cached[0] != raw:
+                cached = self._frames[key] = (raw, pd.read_parquet(io.BytesIO(raw)))
+        return cached[1], {date.fromisoformat(day) for day in covered}
+
+    def _save(self, key, rows, covered):
+        # Рядки і покриття — однією транзакцією, щоб покриття не обіцяло днів, яких немає в рядках
+        self.backend.set_many({
+            f"ga4:{key}:rows": frame_bytes(rows),
+            f"ga4:{key}:covered": json_bytes(sorted(d.isoformat() for d in covered)),
+        })
+
+    def missing_spans(self, key, start_date, end_date, today=None):
+        """
+        Суцільні періоди [(початок, кінець), ...], які треба запитати в GA4,
+        щоб покрити [start_date, end_date]; порожній список — усе вже в кеші.
+        """
+        cutoff = settled_before(today)
+        _, covered = self._load(key)
+        spans = []
+        for day in pd.date_range(start_date, end_date):
+            day = day.date()
+            if day in covered and day < cutoff:
+                continue
+            if spans and spans[-1][1] == day - timedelta(days=1):
+                spans[-1] = (spans[-1][0], day)
+            else:
+                spans.append((day, day))
+        return spans
+
+    def store(self, key, rows, start_date, end_date, today=None):
+        """Зберігає рядки за період [start_date, end_date], замінюючи старі дані за ці дні"""
+        cutoff = settled_before(today)
+        days = {day.date() for day in pd.date_range(start_date, end_date)}
+        with self.backend.lock(f"ga4:{key}"):
+            old, covered = self._load(key)
+            if old is not None:
+                old = old[~old["date"].dt.date.isin(days)]
+                rows = pd.concat([old, rows], ignore_index=True)
+            rows = rows.sort_values("date").reset_index(drop=True)
+            # Невстояні дні не позначаємо покритими — наступного разу вони запитаються знову
+            self._save(key, rows, covered | {d for d in days if d < cutoff})
+
+    def rows(self, key, start_date, end_date):
+        """Рядки звіту за період з кешу"""
+        rows, _ = self._load(key)
+        if rows is None:
+            return None
+        mask = (rows["date"] >= pd.Timestamp(start_date)) & (rows["date"] <= pd.Timestamp(end_date))
+        return rows[mask]
+
+    def latest(self, key):
+        """Останній отриманий результат звіту без виміру date (за будь-який період) або None"""
+        return self.backend.get_frame(f"ga4:{key}:latest")
+
+    def get_range(self, key, start_date, end_date):
+        """Результат звіту без виміру date за весь період (для невстояних — не старший за RECENT_RANGE_TTL)"""
+        return self.backend.get_frame(f"ga4:{key}:range:{start_date}:{end_date}")
+
+    def put_range(self, key, start_date, end_date, rows, today=None):
+        # Останній результат за будь-який період — запасний, коли квоту GA4 вичерпано
+        self.backend.set_frame(f"ga4:{key}:latest", rows)
+        ttl = RANGE_TTL if end_date < settled_before(today) else RECENT_RANGE_TTL
+        self.backend.set_frame(f"ga4:{key}:range:{start_date}:{end_date}", rows, ttl=ttl)
@@ -0,0 +1,124 @@
+"""
+Клієнт GA4 Data API, спільний для всього процесу сервера.
+
+Дашборд створює клієнт один раз (через st.cache_resource), а не на кожному
+перезапуску скрипта: один об'єкт облікових даних кешує токен доступу й
+оновлює його лише після закінчення терміну дії, а один gRPC-канал з
+keep-alive залишається відкритим між запитами всіх сесій.
+
+Важкі модулі google-analytics-data імпортуються лише тут, при першому
+створенні клієнта, а не при старті дашборда.
+
+AsyncReportRunner — шлях через асинхронний клієнт Data API: усі звіти,
+потрібні сторінці, відправляються одночасно (кожен зі своїм дедлайном), тож
+час GA4 на перезапуск — приблизно один мережевий round-trip, а не сума
+послідовних batchRunReports.
+"""
+
+import asyncio
+import threading
+
+# Доступ лише на читання звітів GA4
+SCOPES = ["https://www.googleapis.com/auth/analytics.readonly"]
+
+# Пінги keep-alive, щоб простоюваний канал не закривався проксі чи балансувальником
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# Дедлайн одного звіту GA4 (секунд)
+REPORT_DEADLINE = 30
+
+
+def _credentials(credentials_info):
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+
+
+def build_client(credentials_info):
+    """BetaAnalyticsDataClient з облікових даних сервісного акаунта і каналом з keep-alive"""
+    from google.analytics.data_v1beta import BetaAnalyticsDataClient
+    from google.analytics.data_v1beta.services.beta_analytics_data.transports import (
+        BetaAnalyticsDataGrpcTransport,
+    )
+
+    channel = BetaAnalyticsDataGrpcTransport.create_channel(
+        credentials=_credentials(credentials_info),
+        options=KEEPALIVE_OPTIONS,
+    )
+    return BetaAnalyticsDataClient(transport=BetaAnalyticsDataGrpcTransport(channel=channel))
+
+
+class AsyncReportRunner:
+    """
+    Асинхронний клієнт GA4 у власному циклі подій (окремий фоновий потік).
+
+    Скрипт Streamlit виконується у звичайних потоках, тож звіти передаються
+    в цикл через run_coroutine_threadsafe, там запускаються разом через
+    asyncio.gather, а потік сесії синхронно чекає на всі відповіді.
+    """
+
+    def __init__(self, credentials_info, deadline=REPORT_DEADLINE):
+        self.deadline = deadline
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ga4-async", daemon=True)
+        self._thread.start()
+        # Канал gRPC asyncio прив'язаний до циклу, у якому створений, — створюємо клієнт усередині нього
+        self._client = self._submit(self._create_client(credentials_info)).result()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    @staticmethod
+    async def _create_client(credentials_info):
+        from google.analytics.data_v1beta import BetaAnalyticsDataAsyncClient
+        from google.analytics.data_v1beta.services.beta_analytics_data.transports import (
+            BetaAnalyticsDataGrpcAsyncIOTransport,
+        )
+
+        channel = BetaAnalyticsDataGrpcAsyncIOTransport.create_channel(
+            credentials=_credentials(credentials_info),
+            options=KEEPALIVE_OPTIONS,
+        )
+        return BetaAnalyticsDataAsyncClient(transport=BetaAnalyticsDataGrpcAsyncIOTransport(channel=channel))
+
+    def run_reports(self, property_id, requests, deadline=None, scheduler=None):
+        """
+        Виконує звіти {ключ: RunReportRequest} одночасно і повертає
+        {ключ: RunReportResponse}. Кожен звіт має дедлайн `deadline` секунд;
+        помилка будь-якого звіту піднімається після завершення решти.
+        З QuotaScheduler кожен звіт проходить через його чергу і повтори.
+        """
+        deadline = deadline or self.deadline
+        future = self._submit(self._gather(property_id, requests, deadline, scheduler))
+        # Запас понад дедлайни всіх спроб — на випадок, якщо цикл подій завис
+        attempts = scheduler.max_attempts if scheduler is not None else 1
+        try:
+            return future.result(timeout=deadline * attempts * 2)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def _gather(self, property_id, requests, deadline, scheduler):
+        from google.analytics.data_v1beta.types import RunReportRequest
+
+        async def run(request):
+            request = RunReportRequest(request)
+            request.property = f"properties/{property_id}"
+            if scheduler is None:
+                return await self._client.run_report(request, timeout=deadline)
+            request.return_property_quota = True
+            response = await scheduler.acall(lambda: self._client.run_report(request, timeout=deadline))
+            scheduler.record(response.property_quota)
+            return response
+
+        keys = list(requests)
+        responses = await asyncio.gather(*(run(requests[key]) for key in keys), return_exceptions=True)
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+        return dict(zip(keys, responses))
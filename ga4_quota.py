@@ -0,0 +1,220 @@
+"""
+Планувальник запитів до GA4 Data API з урахуванням квот.
+
+Кожен запит до GA4 (batchRunReports звичайного клієнта чи runReport
+асинхронного) проходить через QuotaScheduler:
+
+- запити просять return_property_quota, і з кожної відповіді оновлюється
+  поточний стан квот ресурсу: токени за годину і за день, одночасні запити тощо;
+- швидкість обмежується відром токенів (token bucket), а кількість
+  одночасних запитів — семафором;
+- тимчасові помилки (недоступність, дедлайн, внутрішня помилка сервера, ліміт
+  одночасних запитів) повторюються з експоненційною затримкою і випадковим
+  розкидом (full jitter);
+- коли квоту вичерпано, запит не виконується, а піднімається
+  QuotaExhaustedError — ga4_reports у такому разі віддає останні дані з кешу.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Квоти з property_quota, які показуються в бічній панелі
+QUOTA_FIELDS = {
+    "tokens_per_hour": "Токени за годину",
+    "tokens_per_day": "Токени за день",
+    "tokens_per_project_per_hour": "Токени проєкту за годину",
+    "concurrent_requests": "Одночасні запити",
+    "server_errors_per_project_per_hour": "Помилки сервера за годину",
+    "potentially_thresholded_requests_per_hour": "Запити з порогами за годину",
+}
+
+# Квоти токенів: коли будь-яку з них вичерпано, нові запити не відправляються
+TOKEN_QUOTAS = ("tokens_per_hour", "tokens_per_day", "tokens_per_project_per_hour")
+
+DEFAULT_RATE = 2.0  # запитів на секунду в середньому
+DEFAULT_BURST = 10  # скільки запитів можна відправити одразу
+DEFAULT_MAX_CONCURRENT = 8  # GA4 дозволяє 10 одночасних запитів на ресурс
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5  # секунд
+BACKOFF_MAX = 8.0
+
+# Скільки не відправляти запити після вичерпання квоти (секунд)
+EXHAUSTED_COOLDOWN = 5 * 60
+
+_SLOT_POLL = 0.02
+
+
+class QuotaExhaustedError(RuntimeError):
+    """Квоту GA4 вичерпано — запит не виконувався, слід узяти дані з кешу"""
+
+
+def _api_errors():
+    """(тимчасові помилки, помилка вичерпаної квоти) google-api-core"""
+    from google.api_core import exceptions
+
+    transient = (
+        exceptions.ServiceUnavailable,
+        exceptions.DeadlineExceeded,
+        exceptions.InternalServerError,
+        exceptions.Aborted,
+    )
+    return transient, exceptions.ResourceExhausted
+
+
+class TokenBucket:
+    """Відро токенів: `rate` запитів на секунду з запасом до `burst` одразу"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Бере токен і повертає, скільки секунд почекати, поки він стане доступним"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class QuotaScheduler:
+    """Черга запитів до GA4: відро токенів, ліміт одночасних запитів, повтори і стан квот"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 max_attempts=MAX_ATTEMPTS, cooldown=EXHAUSTED_COOLDOWN):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.cooldown = cooldown
+        self.quota = {}
+        self.quota_updated = None
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.exhausted_until = 0.0
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prepare(request):
+        """Копія запиту, у відповідь на який GA4 поверне стан квот"""
+        prepared = type(request)(request)
+        prepared.return_property_quota = True
+        return prepared
+
+    def record(self, property_quota):
+        """Оновлює стан квот з property_quota відповіді"""
+        if property_quota is None:
+            return
+        quota = {}
+        for field in QUOTA_FIELDS:
+            status = getattr(property_quota, field, None)
+            if status is not None and (status.consumed or status.remaining):
+                quota[field] = (status.consumed, status.remaining)
+        if not quota:
+            return
+        with self._lock:
+            self.quota.update(quota)
+            self.quota_updated = datetime.now()
+            if any(quota.get(field, (0, 1))[1] <= 0 for field in TOKEN_QUOTAS):
+                self.exhausted_until = time.time() + self.cooldown
+
+    def exhausted(self):
+        return time.time() < self.exhausted_until
+
+    def _check(self):
+        if self.exhausted():
+            raise QuotaExhaustedError("Квоту GA4 Data API вичерпано")
+
+    def _throttle_delay(self):
+        delay = self.bucket.reserve()
+        with self._lock:
+            self.requests += 1
+            self.throttled_seconds += delay
+        return delay
+
+    def _retry_delay(self, error, attempt):
+        """Затримка перед наступною спробою або виняток, якщо повторювати не варто"""
+        transient, quota_error = _api_errors()
+        if not isinstance(error, transient + (quota_error,)):
+            raise error
+        if attempt + 1 >= self.max_attempts:
+            if isinstance(error, quota_error):
+                with self._lock:
+                    self.exhausted_until = time.time() + self.cooldown
+                raise QuotaExhaustedError(f"Квоту GA4 Data API вичерпано: {error}") from error
+            raise error
+        with self._lock:
+            self.retries += 1
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    @contextmanager
+    def _running(self):
+        """Запит, що виконується: слот семафора вже взятий і звільняється в кінці"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+
+    def call(self, func):
+        """Виконує func() (синхронний запит до GA4) з обмеженням швидкості і повторами"""
+        for attempt in range(self.max_attempts):
+            self._check()
+            time.sleep(self._throttle_delay())
+            self._slots.acquire()
+            try:
+                with self._running():
+                    return func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+            time.sleep(delay)
+
+    async def acall(self, func):
+        """Те саме для асинхронного запиту: func() повертає корутину"""
+        for attempt in range(self.max_attempts):
+            self._check()
+            await asyncio.sleep(self._throttle_delay())
+            # Семафор спільний із синхронними запитами, тож чекаємо на нього без блокування циклу
+            while not self._slots.acquire(blocking=False):
+                await asyncio.sleep(_SLOT_POLL)
+            try:
+                with self._running():
+                    return await func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+            await asyncio.sleep(delay)
+
+    def quota_table(self):
+        """Стан квот для бічної панелі: використано і залишилось"""
+        with self._lock:
+            quota = dict(self.quota)
+        rows = [
+            {"Квота": label, "Використано": quota[field][0], "Залишилось": quota[field][1]}
+            for field, label in QUOTA_FIELDS.items()
+            if field in quota
+        ]
+        return pd.DataFrame(rows, columns=["Квота", "Використано", "Залишилось"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "in_flight": self.in_flight,
+            }
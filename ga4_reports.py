@@ -0,0 +1,315 @@
+"""
+Шар запитів до GA4 для вкладок «Застосунок CASES» і «Сайт cases.media».
+
+Сумісні звіти об'єднуються в один багатометричний запит (наприклад,
+totalUsers і sessions), PWA-користувачі беруться одним запитом з розбивкою
+за operatingSystem, а решта звітів відправляється разом через
+batchRunReports. Відповіді розкладаються назад у DataFrame для кожного графіка.
+З асинхронним виконавцем (AsyncReportRunner) усі звіти натомість
+відправляються одночасно окремими runReport.
+
+Якщо передано DailyReportCache, денні звіти запитуються лише за дні,
+яких немає в кеші, а весь період збирається з кешу.
+
+Звіти без явного limit GA4 віддає сторінками (за замовчуванням до 10 000
+рядків), тож такі звіти дочитуються через offset, поки не прийдуть усі
+row_count рядків; звіти з limit (топ сторінок) — лише перша сторінка.
+
+Якщо передано QuotaScheduler, кожен запит до GA4 проходить через нього
+(обмеження швидкості, повтори, стан квот), а коли квоту вичерпано — звіти
+збираються з того, що вже є в кеші.
+"""
+
+import pandas as pd
+from ga4_cache import report_key
+from ga4_quota import QuotaExhaustedError
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsRequest,
+    DateRange,
+    Dimension,
+    Filter,
+    FilterExpression,
+    Metric,
+    OrderBy,
+    RunReportRequest,
+    RunReportResponse,
+)
+
+# batchRunReports приймає не більше 5 звітів за раз
+MAX_BATCH_SIZE = 5
+
+# Скільки секунд сесія чекає на такий самий звіт, який уже запитала інша сесія
+REPORT_TIMEOUT = 60
+
+# Скільки рядків просити на кожну наступну сторінку звіту (GA4 віддає до 250 000)
+PAGE_SIZE = 100_000
+
+
+def _string_filter(field_name, value):
+    return FilterExpression(
+        filter=Filter(
+            field_name=field_name,
+            string_filter=Filter.StringFilter(value=value)
+        )
+    )
+
+
+def build_site_requests(start_date, end_date):
+    """
+    Звіти, потрібні вкладкам GA4, за ключем:
+    - pwa: активні користувачі PWA (display_mode = standalone) по днях і ОС
+    - installs: події pwa_installed по днях
+    - traffic: унікальні користувачі та сеанси сайту по днях
+    - pages: топ-10 сторінок за переглядами
+    """
+    date_ranges = [DateRange(
+        start_date=start_date.strftime("%Y-%m-%d"),
+        end_date=end_date.strftime("%Y-%m-%d")
+    )]
+    return {
+        "pwa": RunReportRequest(
+            dimensions=[Dimension(name="date"), Dimension(name="operatingSystem")],
+            metrics=[Metric(name="activeUsers")],
+            date_ranges=date_ranges,
+            dimension_filter=_string_filter("customUser:display_mode", "standalone"),
+        ),
+        "installs": RunReportRequest(
+            dimensions=[Dimension(name="date")],
+            metrics=[Metric(name="eventCount")],
+            date_ranges=date_ranges,
+            dimension_filter=_string_filter("eventName", "pwa_installed"),
+        ),
+        "traffic": RunReportRequest(
+            dimensions=[Dimension(name="date")],
+            metrics=[Metric(name="totalUsers"), Metric(name="sessions")],
+            date_ranges=date_ranges,
+        ),
+        "pages": RunReportRequest(
+            dimensions=[Dimension(name="pagePath")],
+            metrics=[Metric(name="screenPageViews")],
+            date_ranges=date_ranges,
+            order_bys=[
+                OrderBy(
+                    metric=OrderBy.MetricOrderBy(metric_name="screenPageViews"),
+                    desc=True
+                )
+            ],
+            limit=10,
+        ),
+    }
+
+
+def run_batched(client, property_id, requests, scheduler=None):
+    """
+    Виконує звіти {ключ: RunReportRequest} через batchRunReports
+    (по MAX_BATCH_SIZE за виклик) і повертає {ключ: RunReportResponse}.
+    """
+    keys = list(requests)
+    responses = {}
+    for i in range(0, len(keys), MAX_BATCH_SIZE):
+        chunk = keys[i:i + MAX_BATCH_SIZE]
+        batch_request = BatchRunReportsRequest(
+            property=f"properties/{property_id}",
+            requests=[
+                scheduler.prepare(requests[key]) if scheduler is not None else requests[key]
+                for key in chunk
+            ],
+        )
+        if scheduler is None:
+            batch = client.batch_run_reports(batch_request)
+        else:
+            batch = scheduler.call(lambda: client.batch_run_reports(batch_request))
+            for report in batch.reports:
+                scheduler.record(report.property_quota)
+        responses.update(zip(chunk, batch.reports))
+    return responses
+
+
+def _run_once(client, property_id, requests, scheduler=None):
+    if hasattr(client, "run_reports"):
+        return client.run_reports(property_id, requests, scheduler=scheduler)
+    return run_batched(client, property_id, requests, scheduler)
+
+
+def _has_more(request, response):
+    """Чи є в звіті без явного limit ще рядки понад отримані"""
+    return not request.limit and len(response.rows) < response.row_count
+
+
+def _next_page(request, offset):
+    page = RunReportRequest(request)
+    page.offset = offset
+    page.limit = PAGE_SIZE
+    return page
+
+
+def run_reports(client, property_id, requests, scheduler=None):
+    """
+    Виконує звіти {ключ: RunReportRequest}: через асинхронний виконавець
+    (усі одночасно), якщо це він, інакше — через batchRunReports. Звіти
+    без явного limit дочитуються сторінками, поки не прийдуть усі рядки.
+    """
+    responses = _run_once(client, property_id, requests, scheduler)
+    pending = [key for key, response in responses.items() if _has_more(requests[key], response)]
+    while pending:
+        pages = _run_once(
+            client, property_id,
+            {key: _next_page(requests[key], len(responses[key].rows)) for key in pending},
+            scheduler,
+        )
+        for key, page in pages.items():
+            responses[key].rows.extend(page.rows)
+        # Порожня сторінка — GA4 більше нічого не віддасть, не зациклюємося
+        pending = [key for key, page in pages.items() if page.rows and _has_more(requests[key], responses[key])]
+    return responses
+
+
+def _columns(request):
+    return [d.name for d in request.dimensions], [m.name for m in request.metrics]
+
+
+def response_to_df(response, dimensions, metrics):
+    """Перетворює відповідь GA4 у DataFrame з колонками вимірів і метрик"""
+    rows = [
+        [value.value for value in row.dimension_values]
+        + [int(value.value or 0) for value in row.metric_values]
+        for row in response.rows
+    ]
+    df = pd.DataFrame(rows, columns=dimensions + metrics)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], format="%Y%m%d")
+        df = df.sort_values("date")
+    return df
+
+
+def pwa_frame(df):
+    """
+    Активні користувачі PWA по днях: усі разом і окремо з Android.
+
+    Загальна кількість — сума по ОС; користувач, що відкривав PWA з двох ОС
+    в один день, буде врахований двічі, але для PWA це поодинокі випадки.
+    """
+    total = df.groupby("date")["activeUsers"].sum().rename("Всі користувачі PWA")
+    android = (
+        df[df["operatingSystem"] == "Android"]
+        .groupby("date")["activeUsers"].sum()
+        .rename("Користувачі PWA з Android")
+    )
+    return pd.concat([total, android], axis=1).fillna(0).astype(int).reset_index()
+
+
+def installs_frame(df):
+    """Кількість встановлень PWA по днях"""
+    return df.rename(columns={"eventCount": "Встановлення PWA"})
+
+
+def traffic_frame(df):
+    """Унікальні користувачі сайту і сеанси по днях"""
+    return df.rename(columns={"totalUsers": "Унікальні користувачі", "sessions": "Сеанси"})
+
+
+def pages_frame(df):
+    """Топ сторінок за переглядами"""
+    return df.rename(columns={"pagePath": "Сторінка", "screenPageViews": "Перегляди"})
+
+
+FRAME_BUILDERS = {
+    "pwa": pwa_frame,
+    "installs": installs_frame,
+    "traffic": traffic_frame,
+    "pages": pages_frame,
+}
+
+
+def _with_range(request, start_date, end_date):
+    narrowed = RunReportRequest(request)
+    narrowed.date_ranges = [DateRange(
+        start_date=start_date.strftime("%Y-%m-%d"),
+        end_date=end_date.strftime("%Y-%m-%d")
+    )]
+    return narrowed
+
+
+def fetch_report_rows(client, property_id, requests, start_date, end_date, cache=None, scheduler=None):
+    """
+    Повертає {ключ: DataFrame рядків звіту} за період [start_date, end_date].
+
+    Без кешу всі звіти йдуть до GA4 разом (run_reports). З кешем денні звіти
+    (перший вимір — date) запитуються окремо для кожного суцільного проміжку
+    відсутніх і невстояних днів, а інші — лише якщо їхнього результату
+    за цей період ще немає. Якщо квоту вичерпано, денні звіти беруться з кешу
+    як є, а інші — останній збережений результат.
+    """
+    to_fetch, spans, rows = {}, {}, {}
+    for key, request in requests.items():
+        if cache is None:
+            to_fetch[key] = request
+            continue
+        cache_key = report_key(request)
+        dimensions, _ = _columns(request)
+        if dimensions[0] == "date":
+            for span in cache.missing_spans(cache_key, start_date, end_date):
+                spans[(key, span)] = span
+                to_fetch[(key, span)] = _with_range(request, *span)
+        else:
+            cached = cache.get_range(cache_key, start_date, end_date)
+            if cached is None:
+                to_fetch[key] = request
+            else:
+                rows[key] = cached
+
+    try:
+        responses = run_reports(client, property_id, to_fetch, scheduler) if to_fetch else {}
+    except QuotaExhaustedError:
+        if cache is None:
+            raise
+        responses = {}
+        for key, request in requests.items():
+            if key not in rows and _columns(request)[0][0] != "date":
+                rows[key] = cache.latest(report_key(request))
+
+    for fetch_key, response in responses.items():
+        key = fetch_key[0] if fetch_key in spans else fetch_key
+        request = requests[key]
+        df = response_to_df(response, *_columns(request))
+        if cache is None:
+            rows[key] = df
+        elif fetch_key in spans:
+            cache.store(report_key(request), df, *spans[fetch_key])
+        else:
+            cache.put_range(report_key(request), start_date, end_date, df)
+            rows[key] = df
+
+    # Денні звіти збираємо з кешу за весь запитаний період
+    for key, request in requests.items():
+        if key not in rows:
+            rows[key] = cache.rows(report_key(request), start_date, end_date)
+        if rows[key] is None:
+            # Запасного результату в кеші немає — порожній звіт
+            dimensions, metrics = _columns(request)
+            rows[key] = response_to_df(RunReportResponse(), dimensions, metrics)
+    return rows
+
+
+def fetch_site_reports(client, property_id, start_date, end_date, cache=None, keys=None,
+                       flights=None, timeout=REPORT_TIMEOUT, scheduler=None):
+    """
+    Звіти GA4 сторінки (усі або лише `keys`) за мінімум запитів;
+    повертає {ключ: DataFrame для графіка}.
+
+    Якщо передано SingleFlight, однакові запити кількох сесій, що виконуються
+    одночасно, об'єднуються: запит іде в GA4 один раз, решта сесій чекає
+    на його результат (не довше `timeout` секунд).
+    """
+    requests = build_site_requests(start_date, end_date)
+    if keys is not None:
+        requests = {key: requests[key] for key in keys}
+
+    def fetch():
+        rows = fetch_report_rows(client, property_id, requests, start_date, end_date, cache, scheduler)
+        return {key: FRAME_BUILDERS[key](df) for key, df in rows.items()}
+
+    if flights is None:
+        return fetch()
+    flight_key = ("ga4", property_id, str(start_date), str(end_date), tuple(requests))
+    return flights.do(flight_key, fetch, timeout=timeout)
@@ -0,0 +1,75 @@
+"""
+Щоденний знімок KPI передплат без Streamlit.
+
+Завантажує CSV усіх тарифів, будує TariffCube і записує повний набір KPI
+(потоки, Churned Users, MRR, Churn rate, Lifetime, ARPPU, LTV, CAC, LTV/CAC)
+для кожного дня і кожного тарифу в один Parquet-файл. Запуск, наприклад, з cron:
+
+    python kpi_snapshot.py --output .snapshots/kpi_daily.parquet
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from cube import TariffCube
+from data_loader import DEFAULT_MAX_WORKERS, DEFAULT_TIMEOUT, load_datasets
+from metrics import daily_kpis
+from snapshot_store import DEFAULT_ROOT
+from sources import tariff_files
+
+DEFAULT_OUTPUT = os.path.join(DEFAULT_ROOT, "kpi_daily.parquet")
+DEFAULT_AD_BUDGET = 5000
+
+
+def build_kpi_snapshot(frames, ad_budget=DEFAULT_AD_BUDGET):
+    """KPI кожного тарифу за кожен день з {назва тарифу: DataFrame}"""
+    return daily_kpis(TariffCube.from_frames(frames), ad_budget)
+
+
+def write_kpi_snapshot(kpis, path):
+    """Атомарно записує знімок: спершу у тимчасовий файл, потім перейменування"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    kpis.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_kpi_snapshot(path=DEFAULT_OUTPUT, start_date=None, end_date=None, tariffs=None):
+    """Читає знімок (за потреби — лише за період і вибрані тарифи)"""
+    filters = []
+    if start_date is not None:
+        filters.append(("date", ">=", pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(("date", "<=", pd.Timestamp(end_date)))
+    if tariffs is not None:
+        filters.append(("tariff", "in", list(tariffs)))
+    return pd.read_parquet(path, filters=filters or None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Записати щоденний знімок KPI по всіх тарифах")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="шлях до Parquet-файлу")
+    parser.add_argument("--ad-budget", type=float, default=DEFAULT_AD_BUDGET, help="рекламний бюджет для CAC")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    result = load_datasets(tariff_files, max_workers=args.workers, timeout=args.timeout)
+    for name, error in result.errors.items():
+        print(f"Не вдалося завантажити тариф {name}: {error}", file=sys.stderr)
+    if not result.frames:
+        return 1
+
+    kpis = build_kpi_snapshot(result.frames, ad_budget=args.ad_budget)
+    write_kpi_snapshot(kpis, args.output)
+    print(f"{len(kpis)} рядків ({kpis['tariff'].nunique()} тарифів) -> {args.output}")
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
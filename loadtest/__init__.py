@@ -0,0 +1,11 @@
+"""
+Навантажувальний тест дашборда: одночасні сесії app.py в одному процесі
+Streamlit з локальними замінниками Google Drive і GA4.
+
+Запуск з кореня репозиторію:
+
+    python -m loadtest                                  # 8 сесій по 10 дій
+    python -m loadtest --sessions 32 --reruns 20        # більше сесій
+    python -m loadtest --ga4-latency 2 --secret ga4_async=false
+    python -m loadtest --json loadtest.json             # результати у файл
+"""
@@ -0,0 +1,302 @@
+"""
+Навантажувальний тест: N одночасних сесій app.py в одному процесі.
+
+Кожна сесія — окремий AppTest (streamlit.testing) у власному потоці: перший
+запуск, далі `--reruns` випадкових дій з паузою «на роздуми» між ними —
+зміна швидкого періоду, набору тарифів або вкладки. Drive і GA4 замінені
+локальними замінниками з затримкою (loadtest/stubs.py), тож тест не ходить
+у мережу і не потребує облікових даних.
+
+Звіт: p50/p95/p99 часу перезапуску за видом дії і загалом, пікова RSS
+процесу і кількість звернень до Drive і GA4 на перезапуск. Процес
+завершується з кодом 1, якщо хоча б один перезапуск закінчився винятком.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from loadtest.stubs import Latency, OutboundCalls, stubbed_sources
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+PERCENTILES = (50, 95, 99)
+
+# Дії сесії і підписи віджетів, які вони змінюють
+ACTIONS = ("preset", "tariffs", "tab")
+PRESET_LABEL = "Швидкий вибір періоду:"
+TARIFFS_LABEL = "Оберіть тарифи"
+TAB_KEY = "active_tab"
+MAX_SELECTED_TARIFFS = 3
+
+# Скільки секунд без звернень до джерел вважати завершенням фонового прогріву і скільки чекати найдовше
+QUIET_SECONDS = 1.0
+WARMUP_LIMIT = 120
+
+
+def peak_rss_mb():
+    """Пікова RSS процесу, МБ (ru_maxrss — у кілобайтах на Linux і в байтах на macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+@contextmanager
+def shared_streamlit_runtime(secrets):
+    """
+    AppTest розрахований на один запуск за раз: кожен run() ставить власний
+    Runtime, st.secrets і опцію global.appTest, а в кінці прибирає їх. Для
+    одночасних сесій ці глобальні об'єкти встановлюються один раз на весь
+    тест, а run() окремих сесій працює з ними, нічого не підміняючи.
+
+    Скомпільований app.py теж спільний, як у справжньому сервері: кожен run()
+    інакше розбирав би скрипт заново, а одночасний ast.parse у кількох
+    потоках ламається в деяких версіях CPython 3.11.
+    """
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+
+    class SessionRuntime(Runtime):
+        """Сюди run() окремих сесій записує свій Runtime, не чіпаючи спільний"""
+        _instance = None
+
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    script_cache = ScriptCache()
+    shared_secrets = Secrets()
+    shared_secrets._secrets = secrets
+
+    saved_secrets = st.secrets
+    Runtime._instance = runtime
+    st.secrets = shared_secrets
+    try:
+        with (
+            patch_config_options({"global.appTest": True}),
+            mock.patch.object(app_test, "Runtime", SessionRuntime),
+            mock.patch.object(app_test, "ScriptCache", lambda: script_cache),
+            mock.patch.object(local_script_runner, "ScriptCache", lambda: script_cache),
+        ):
+            yield
+    finally:
+        st.secrets = saved_secrets
+        Runtime._instance = None
+
+
+def _widget(widgets, label=None, key=None):
+    for widget in widgets:
+        if (label is not None and widget.label == label) or (key is not None and widget.key == key):
+            return widget
+    return None
+
+
+def random_action(at, rng):
+    """
+    Змінює один віджет сесії випадковим чином і повертає назву дії.
+    Тарифи обираються лише на вкладці, де є їхній список; інакше — інша вкладка.
+    """
+    action = rng.choice(ACTIONS)
+    tariffs = _widget(at.multiselect, label=TARIFFS_LABEL)
+    if action == "tariffs" and tariffs is not None:
+        tariffs.set_value(rng.sample(tariffs.options, rng.randint(1, MAX_SELECTED_TARIFFS)))
+        return action
+    tab = _widget(at.radio, key=TAB_KEY)
+    if action == "tab" or (action == "tariffs" and tab is not None):
+        if tab is not None:
+            tab.set_value(rng.choice([option for option in tab.options if option != tab.value]))
+            return "tab"
+    preset = _widget(at.sidebar.selectbox, label=PRESET_LABEL)
+    if preset is None:
+        raise LookupError("після запуску немає віджетів — скрипт не виконався")
+    preset.set_value(rng.choice([option for option in preset.options if option != preset.value]))
+    return "preset"
+
+
+class LoadTest:
+    """Сесії навантажувального тесту і зібрані з них виміри"""
+
+    def __init__(self, app_path, sessions, reruns, think, timeout, seed):
+        self.app_path = app_path
+        self.sessions = sessions
+        self.reruns = reruns
+        self.think = think
+        self.timeout = timeout
+        self.seed = seed
+        self.runs = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def _timed_run(self, at, session, action):
+        started = time.perf_counter()
+        at.run()
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.runs.append({"session": session, "action": action, "seconds": seconds})
+            self.errors.extend(f"сесія {session}, {action}: {e.message}" for e in at.exception)
+
+    def _session(self, session):
+        from streamlit.testing.v1 import AppTest
+
+        rng = random.Random(self.seed + session)
+        at = AppTest.from_file(self.app_path, default_timeout=self.timeout)
+        try:
+            self._timed_run(at, session, "start")
+            for _ in range(self.reruns):
+                time.sleep(rng.uniform(0, 2 * self.think))
+                self._timed_run(at, session, random_action(at, rng))
+        except Exception as e:
+            # Сесія зупиняється, а помилка потрапляє у звіт
+            with self._lock:
+                self.errors.append(f"сесія {session}: {type(e).__name__}: {e}")
+
+    def warm_up(self, calls):
+        """
+        Перший (холодний) запуск однієї сесії, після нього — очікування,
+        поки фонове прогрівання дашборда перестане звертатися до джерел.
+        """
+        self._session(-1)
+        deadline = time.monotonic() + WARMUP_LIMIT
+        while time.monotonic() - calls.last_call < QUIET_SECONDS and time.monotonic() < deadline:
+            time.sleep(QUIET_SECONDS / 4)
+        with self._lock:
+            self.runs.clear()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._session, args=(session,), name=f"loadtest-session-{session}")
+            for session in range(self.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def latency_table(runs):
+    """p50/p95/p99 і максимум часу перезапуску (мс) за видом дії і загалом"""
+    df = pd.DataFrame(runs, columns=["session", "action", "seconds"])
+    groups = [(action, group["seconds"]) for action, group in df.groupby("action")]
+    groups.append(("усі", df["seconds"]))
+    rows = []
+    for action, seconds in groups:
+        ms = seconds.to_numpy() * 1000
+        row = {"дія": action, "запусків": len(ms)}
+        row.update({f"p{p}, мс": round(float(np.percentile(ms, p)), 1) if len(ms) else None for p in PERCENTILES})
+        row["max, мс"] = round(float(ms.max()), 1) if len(ms) else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def parse_secret(item):
+    """key=value з командного рядка; значення — JSON (true, 15, "текст") або просто рядок"""
+    key, _, value = item.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Навантажувальний тест дашборда з одночасними сесіями")
+    parser.add_argument("--sessions", type=int, default=8, help="скільки сесій працюють одночасно")
+    parser.add_argument("--reruns", type=int, default=10, help="скільки дій робить кожна сесія після першого запуску")
+    parser.add_argument("--think", type=float, default=0.5, help="середня пауза між діями сесії, с")
+    parser.add_argument("--drive-latency", type=float, default=0.3, help="затримка Drive, с")
+    parser.add_argument("--ga4-latency", type=float, default=0.5, help="затримка GA4, с")
+    parser.add_argument("--jitter", type=float, default=0.5, help="розкид затримки, частка від неї")
+    parser.add_argument("--days", type=int, default=730, help="скільки днів історії в синтетичних CSV")
+    parser.add_argument("--timeout", type=float, default=120, help="найдовший допустимий перезапуск, с")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-warmup", action="store_true", help="не прогрівати кеші окремою сесією перед тестом")
+    parser.add_argument("--secret", action="append", default=[], metavar="KEY=VALUE",
+                        help="додатковий секрет дашборда, наприклад lazy_tabs=false")
+    parser.add_argument("--app", default=APP_PATH)
+    parser.add_argument("--json", help="записати результати у JSON-файл")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    calls = OutboundCalls()
+    test = LoadTest(args.app, args.sessions, args.reruns, args.think, args.timeout, args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        secrets = {
+            "property_id": "0",
+            "google_credentials": {},
+            "snapshot_dir": workdir,
+            "cache_path": os.path.join(workdir, "cache.sqlite"),
+            **dict(parse_secret(item) for item in args.secret),
+        }
+        with stubbed_sources(args.days, Latency(args.drive_latency, args.jitter),
+                             Latency(args.ga4_latency, args.jitter), calls), shared_streamlit_runtime(secrets):
+            warmup = {}
+            if not args.no_warmup:
+                started = time.perf_counter()
+                test.warm_up(calls)
+                warmup = {"seconds": round(time.perf_counter() - started, 2), "calls": calls.snapshot()}
+            rss_before = peak_rss_mb()
+            calls_before = calls.snapshot()
+
+            started = time.perf_counter()
+            test.run()
+            wall = time.perf_counter() - started
+
+    reruns = len(test.runs)
+    outbound = {
+        source: count - calls_before.get(source, 0) for source, count in calls.snapshot().items()
+    }
+    table = latency_table(test.runs)
+    summary = {
+        "sessions": args.sessions,
+        "reruns": reruns,
+        "wall_seconds": round(wall, 2),
+        "reruns_per_second": round(reruns / wall, 2) if wall else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_before_sessions_mb": round(rss_before, 1),
+        "outbound_calls": outbound,
+        "outbound_calls_per_rerun": {source: round(count / reruns, 3) for source, count in outbound.items()} if reruns else {},
+        "warmup": warmup,
+        "errors": len(test.errors),
+    }
+
+    print(table.to_string(index=False))
+    print()
+    print(f"Сесій: {args.sessions}, перезапусків: {reruns} за {summary['wall_seconds']} с "
+          f"({summary['reruns_per_second']} за секунду)")
+    print(f"Пікова RSS: {summary['peak_rss_mb']} МБ (до сесій — {summary['peak_rss_before_sessions_mb']} МБ)")
+    for source, count in sorted(outbound.items()):
+        print(f"Звернень до {source}: {count} ({summary['outbound_calls_per_rerun'][source]} на перезапуск)")
+    if warmup:
+        print(f"Прогрів: {warmup['seconds']} с, звернень {warmup['calls']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "latency": table.to_dict(orient="records")}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    if test.errors:
+        print(f"\nПерезапусків з винятками: {len(test.errors)}", file=sys.stderr)
+        for error in test.errors[:20]:
+            print(f"  {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Локальні замінники Google Drive і GA4 Data API із заданою затримкою.
+
+- StubDrive замінює `requests` у data_loader: віддає синтетичні CSV
+  (benchmarks.synthetic) для всіх файлів sources.py і підтримує HTTP Range,
+  тож працює і дописування лише нових рядків;
+- StubGA4Client і StubAsyncGA4Client замінюють звичайний і асинхронний
+  клієнти GA4: на кожен звіт повертають рядки по днях запитаного періоду;
+- OutboundCalls рахує звернення до кожного джерела (разом з фоновими
+  оновленнями, які запускає сам дашборд).
+
+Затримка кожного звернення — `latency` секунд ± `jitter` (частка latency).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.synthetic import stat_frames, tariff_frames, to_csv_bytes
+from sources import statistic_files, tariff_files
+
+# Скільки рядків повертати на звіт без виміру date (топ сторінок)
+TOP_ROWS = 10
+
+
+class OutboundCalls:
+    """Лічильники звернень до зовнішніх джерел: {джерело: кількість}"""
+
+    def __init__(self):
+        self.calls = {}
+        self.last_call = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, source):
+        with self._lock:
+            self.calls[source] = self.calls.get(source, 0) + 1
+            self.last_call = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.calls)
+
+
+class Latency:
+    """Затримка звернення: latency секунд ± jitter × latency"""
+
+    def __init__(self, latency, jitter=0.5):
+        self.latency = latency
+        self.jitter = jitter
+
+    def sample(self):
+        return max(self.latency * (1 + random.uniform(-self.jitter, self.jitter)), 0.0)
+
+
+class _Response:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubDrive:
+    """Замінник модуля requests для data_loader: файли Drive із синтетичних CSV"""
+
+    def __init__(self, days, latency, calls):
+        from data_loader import drive_url
+
+        # Дані закінчуються вчора, як у живих файлах, — інакше періоди від сьогодні виходять за межі даних
+        end = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+        tariffs = tariff_frames(days, len(tariff_files), end=end)
+        frames = dict(zip(tariff_files, tariffs.values())) | stat_frames(days, end=end)
+        contents = to_csv_bytes(frames)
+        file_ids = tariff_files | statistic_files
+        self.files = {drive_url(file_ids[name]): content for name, content in contents.items()}
+        self.latency = latency
+        self.calls = calls
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.record("drive")
+        time.sleep(self.latency.sample())
+        content = self.files.get(url)
+        if content is None:
+            return _Response(b"", 404)
+        range_header = (headers or {}).get("Range")
+        if range_header:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(content):
+                return _Response(b"", 416)
+            return _Response(content[start:], 206)
+        return _Response(content)
+
+
+def report_response(request):
+    """Синтетична відповідь GA4 на RunReportRequest: рядок на кожен день періоду або топ сторінок"""
+    from google.analytics.data_v1beta.types import (
+        DimensionHeader, DimensionValue, MetricHeader, MetricValue, Row, RunReportResponse,
+    )
+
+    dimensions = [dimension.name for dimension in request.dimensions]
+    metrics = [metric.name for metric in request.metrics]
+    date_range = request.date_ranges[0]
+
+    if dimensions and dimensions[0] == "date":
+        days = pd.date_range(date_range.start_date, date_range.end_date).strftime("%Y%m%d")
+        extra = [["Android"], ["iOS"]] if len(dimensions) > 1 else [[]]
+        values = [[day] + rest for day in days for rest in extra]
+    else:
+        values = [[f"/page-{i}"] for i in range(TOP_ROWS)]
+
+    rows = [
+        Row(
+            dimension_values=[DimensionValue(value=value) for value in row],
+            metric_values=[MetricValue(value=str(random.randint(0, 500))) for _ in metrics],
+        )
+        for row in values
+    ]
+    return RunReportResponse(
+        dimension_headers=[DimensionHeader(name=name) for name in dimensions],
+        metric_headers=[MetricHeader(name=name) for name in metrics],
+        rows=rows,
+        row_count=len(rows),
+    )
+
+
+class StubGA4Client:
+    """Замінник BetaAnalyticsDataClient (batchRunReports і runReport)"""
+
+    def __init__(self, latency, calls):
+        self.latency = latency
+        self.calls = calls
+
+    def run_report(self, request, **kwargs):
+        self.calls.record("ga4")
+        time.sleep(self.latency.sample())
+        return report_response(request)
+
+    def batch_run_reports(self, request, **kwargs):
+        from google.analytics.data_v1beta.types import BatchRunReportsResponse
+
+        self.calls.record("ga4")
+        time.sleep(self.latency.sample())
+        return BatchRunReportsResponse(reports=[report_response(r) for r in request.requests])
+
+
+class StubAsyncGA4Client:
+    """Замінник BetaAnalyticsDataAsyncClient"""
+
+    def __init__(self, latency, calls):
+        self.latency = latency
+        self.calls = calls
+
+    async def run_report(self, request, timeout=None, **kwargs):
+        self.calls.record("ga4")
+        await asyncio.sleep(self.latency.sample())
+        return report_response(request)
+
+
+@contextmanager
+def stubbed_sources(days, drive_latency, ga4_latency, calls):
+    """Підміняє Drive і GA4 на час блоку; клієнти GA4 створюються заново через ga4_client"""
+    import data_loader
+    import ga4_client
+
+    async def create_async_client(credentials_info):
+        return StubAsyncGA4Client(ga4_latency, calls)
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(data_loader, "requests", StubDrive(days, drive_latency, calls)))
+        stack.enter_context(mock.patch.object(
+            ga4_client, "build_client", lambda credentials_info: StubGA4Client(ga4_latency, calls)
+        ))
+        stack.enter_context(mock.patch.object(
+            ga4_client.AsyncReportRunner, "_create_client", staticmethod(create_async_client)
+        ))
+        yield
@@ -0,0 +1,202 @@
+"""
+Векторизований розрахунок метрик передплат.
+
+Щоденні ряди (сума потоків, Churned Users, MRR) рахуються по зрізу
+TariffCube (дата × тариф × показник), а цільові показники (MRR, Churn rate,
+Growth rate, Lifetime, ARPPU, LTV, CAC) і таблиця порівняння тарифів —
+по префіксних сумах CubeIndex, без циклів по днях і тарифах. Модуль не
+залежить від Streamlit: його використовують і дашборд, і kpi_snapshot.py.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import FLOW_COLUMNS
+
+# Входи та виходи, з яких рахується Churned Users
+ENTER_COLUMNS = ["start", "new", "reactivated", "upgradedEnter", "downgradedEnter"]
+EXIT_COLUMNS = ["end", "upgradedExit", "downgradedExit"]
+
+_ENTER = [FLOW_COLUMNS.index(col) for col in ENTER_COLUMNS]
+_EXIT = [FLOW_COLUMNS.index(col) for col in EXIT_COLUMNS]
+START, NEW, REACTIVATED, UPGRADED_ENTER, DOWNGRADED_ENTER, END = range(6)
+
+
+def churned(values):
+    """Churned Users = входи − виходи (по останній осі FLOW_COLUMNS), без обрізання"""
+    return values[..., _ENTER].sum(axis=-1) - values[..., _EXIT].sum(axis=-1)
+
+
+def _ratio(numerator, denominator):
+    """Поелементне ділення, де ділення на нуль (або на NaN) дає NaN"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    valid = (denominator != 0) & ~np.isnan(denominator) & ~np.isnan(numerator)
+    return np.divide(numerator, denominator, out=np.full(np.broadcast(numerator, denominator).shape, np.nan), where=valid)
+
+
+def _truthy(values):
+    """Аналог перевірки `if x` для масивів: не нуль і не NaN"""
+    return (values != 0) & ~np.isnan(values)
+
+
+def daily_metrics(cube):
+    """
+    Щоденні ряди по всіх тарифах куба разом: суми потоків, Churned Users
+    (рахуються по сумі тарифів і обрізаються знизу нулем) та MRR.
+    Дні, для яких немає жодного рядка даних, пропускаються.
+    """
+    days = cube.present.any(axis=1)
+    values = cube.values[days]
+    totals = values.sum(axis=1)
+    daily = pd.DataFrame(totals, columns=FLOW_COLUMNS)
+    daily.insert(0, "date", cube.dates[days])
+    daily["Churned Users"] = np.clip(churned(totals), 0, None)
+    daily["MRR"] = values[:, :, START] @ cube.prices
+    return daily
+
+
+def target_metrics(index, tariffs, start_date, end_date, ad_budget):
+    """
+    Метрики на початок/кінець періоду і цільові показники для вибраних
+    тарифів разом за період. Усі суми беруться з CubeIndex, тож розрахунок
+    не залежить від довжини періоду.
+
+    Значення, які неможливо порахувати (ділення на нуль, немає даних),
+    повертаються як None.
+    """
+    positions = index.positions(tariffs)
+    prices = index.cube.prices[positions]
+    flows = index.flows.total(start_date, end_date)[positions]
+    totals = flows.sum(axis=0)
+    days_present = index.days_present.total(start_date, end_date)[positions]
+
+    if days_present.sum() > 0:
+        start_value = int(index.value_on(start_date, "start")[positions].sum())
+        end_value = int(index.value_on(end_date, "end")[positions].sum())
+    else:
+        start_value = end_value = None
+
+    new_subs = int(totals[NEW])
+    churned_total = int(index.selection_churned(tariffs).total(start_date, end_date))
+
+    # MRR: середній start кожного тарифу за дні, коли він є в даних, × ціна
+    avg_start = np.divide(flows[:, START], days_present, out=np.zeros(len(positions)), where=days_present > 0)
+    mrr = int(round(float(avg_start @ prices)))
+
+    mrr_first = index.value_on(start_date, "start")[positions] @ prices
+    mrr_last = index.value_on(end_date, "start")[positions] @ prices
+
+    churn_rate = churned_total / start_value if start_value else None
+    lifetime = 1 / churn_rate if churn_rate else None
+    arppu = mrr / end_value if end_value else None
+    ltv = lifetime * arppu if lifetime and arppu else None
+    cac = ad_budget / new_subs if new_subs else None
+    ltv_cac = ltv / cac if ltv is not None and cac else None
+
+    return {
+        "start_value": start_value,
+        "end_value": end_value,
+        "new": new_subs,
+        "reactivated": int(totals[REACTIVATED]),
+        "upgraded": int(totals[UPGRADED_ENTER]),
+        "downgraded": int(totals[DOWNGRADED_ENTER]),
+        "churned": churned_total,
+        "mrr": mrr,
+        "churn_rate": churn_rate,
+        "growth_rate": (mrr_last - mrr_first) / mrr_first if mrr_first != 0 else 0,
+        "lifetime": lifetime,
+        "arppu": arppu,
+        "ltv": ltv,
+        "cac": cac,
+        "ltv_cac": ltv_cac,
+    }
+
+
+def _derived_kpis(start_val, end_val, new_val, churned_val, mrr_val, ad_budget):
+    """
+    Похідні показники (Churn rate, Lifetime, ARPPU, LTV, CAC, LTV/CAC) для
+    масивів будь-якої форми; те, що неможливо порахувати, дорівнює NaN.
+    """
+    churn_rate = _ratio(churned_val, start_val)
+    lifetime = _ratio(1, np.where(_truthy(churn_rate), churn_rate, np.nan))
+    arppu = _ratio(mrr_val, end_val)
+    ltv = np.where(_truthy(lifetime) & _truthy(arppu), lifetime * arppu, np.nan)
+    cac = _ratio(ad_budget, new_val)
+    ltv_cac = np.where(_truthy(ltv), _ratio(ltv, cac), np.nan)
+    return {
+        "churn_rate": churn_rate,
+        "lifetime": lifetime,
+        "arppu": arppu,
+        "ltv": ltv,
+        "cac": cac,
+        "ltv_cac": ltv_cac,
+    }
+
+
+def comparison_metrics(index, start_date, end_date, ad_budget):
+    """
+    Метрики кожного тарифу окремо за період — для таблиці порівняння тарифів.
+
+    Повертає DataFrame (рядки — тарифи куба, колонки — метрики); те, що
+    неможливо порахувати, дорівнює NaN. Churned Users рахуються по кожному
+    тарифу окремо з обрізанням нулем по днях.
+    """
+    cube = index.cube
+    flows = index.flows.total(start_date, end_date)
+    days_present = index.days_present.total(start_date, end_date)
+
+    start_val = index.value_on(start_date, "start")
+    end_val = index.value_on(end_date, "end")
+    new_val = flows[:, NEW]
+    churned_val = index.churned.total(start_date, end_date)
+    avg_start = np.divide(flows[:, START], days_present, out=np.zeros(len(cube.tariffs)), where=days_present > 0)
+    mrr_val = np.trunc(avg_start * cube.prices)
+
+    return pd.DataFrame(
+        {
+            "start": start_val.astype(int),
+            "end": end_val.astype(int),
+            "new": new_val.astype(int),
+            "reactivated": flows[:, REACTIVATED].astype(int),
+            "churned": churned_val.astype(int),
+            "mrr": mrr_val.astype(int),
+            **_derived_kpis(start_val, end_val, new_val, churned_val, mrr_val, ad_budget),
+        },
+        index=pd.Index(cube.tariffs, name="tariff"),
+    )
+
+
+def daily_kpis(cube, ad_budget):
+    """
+    Повний набір KPI кожного тарифу за кожен день куба — ті самі формули, що
+    й у comparison_metrics для періоду з одного дня, але одним проходом по
+    всьому масиву (дні × тарифи).
+
+    Повертає «довгу» таблицю: date, tariff, потоки, churned, mrr і похідні
+    показники. Пари (день, тариф) без рядка в CSV пропускаються.
+    """
+    values = cube.values
+    start_val = values[:, :, START]
+    end_val = values[:, :, END]
+    new_val = values[:, :, NEW]
+    churned_val = np.clip(churned(values), 0, None)
+    mrr_val = np.trunc(start_val * cube.prices)
+
+    columns = {
+        "start": start_val.astype(int),
+        "end": end_val.astype(int),
+        "new": new_val.astype(int),
+        "reactivated": values[:, :, REACTIVATED].astype(int),
+        "upgraded": values[:, :, UPGRADED_ENTER].astype(int),
+        "downgraded": values[:, :, DOWNGRADED_ENTER].astype(int),
+        "churned": churned_val.astype(int),
+        "mrr": mrr_val.astype(int),
+        **_derived_kpis(start_val, end_val, new_val, churned_val, mrr_val, ad_budget),
+    }
+
+    days, tariffs = np.nonzero(cube.present)
+    kpis = pd.DataFrame({name: column[days, tariffs] for name, column in columns.items()})
+    kpis.insert(0, "tariff", pd.Categorical.from_codes(tariffs, categories=cube.tariffs))
+    kpis.insert(0, "date", cube.dates[days])
+    return kpis
@@ -0,0 +1,130 @@
+"""
+Профілювання одного запуску (rerun) дашборда.
+
+Вмикається параметром адреси `?profile=1` або секретом `profiling = true`.
+Кожна іменована секція app.py (завантаження даних, куб, метрики, кожен
+графік, кожен звіт GA4) обгортається у `profiler.span(...)`; після запуску
+в бічній панелі показується час кожної секції, а семплюючий профайлер
+зберігає файл для офлайн-аналізу:
+
+- з pyinstrument (є в requirements.txt) — `*.speedscope.json`, флеймграф
+  відкривається на https://www.speedscope.app;
+- якщо його не встановлено — `*.prof` зі стандартного cProfile (snakeviz,
+  flameprof тощо); це детермінований профіль, не семплюючий.
+
+Перезапуск лише вкладки-фрагмента не проходить через початок і кінець
+скрипта, тож профілюється окремим RerunProfiler, а його розбивка
+показується в самій вкладці (див. profiled_fragment в app.py).
+
+Коли профілювання вимкнене, span() нічого не міряє і майже нічого не коштує.
+"""
+
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from pyinstrument import Profiler as _SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pyinstrument — необов'язкова залежність
+    _SamplingProfiler = None
+
+DEFAULT_DIR = ".profiles"
+SAMPLING_INTERVAL = 0.001
+
+
+class RerunProfiler:
+    """Спани одного запуску скрипта і (за бажанням) семплюючий профайлер"""
+
+    def __init__(self, enabled=False, output_dir=DEFAULT_DIR):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.spans = []
+        self.total = None
+        self.output_path = None
+        self.error = None
+        self._depth = 0
+        self._started = None
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """Міряє тривалість блоку коду; вкладені спани показуються з відступом"""
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            position = len(self.spans)
+            depth = self._depth
+            self.spans.append([name, depth, None])
+            self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.spans[position][2] = time.perf_counter() - started
+                self._depth -= 1
+
+    @property
+    def running(self):
+        """Чи триває запуск: start() уже був, а stop() ще ні"""
+        return self._started is not None
+
+    def start(self):
+        """Починає запуск: таймер усього rerun і семплюючий профайлер"""
+        if not self.enabled:
+            return
+        self._started = time.perf_counter()
+        try:
+            if _SamplingProfiler is not None:
+                self._sampler = _SamplingProfiler(interval=SAMPLING_INTERVAL, async_mode="disabled")
+                self._sampler.start()
+            else:
+                self._sampler = cProfile.Profile()
+                self._sampler.enable()
+        except (RuntimeError, ValueError) as e:
+            # Наприклад, cProfile вже працює в іншій сесії цього процесу
+            self._sampler = None
+            self.error = str(e)
+
+    def stop(self):
+        """Зупиняє профайлер і записує файл флеймграфа; повертає шлях до нього"""
+        if not self.enabled or self._started is None:
+            return None
+        self.total = time.perf_counter() - self._started
+        self._started = None
+        if self._sampler is None:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        if _SamplingProfiler is not None:
+            self._sampler.stop()
+            path = os.path.join(self.output_dir, f"rerun-{stamp}.speedscope.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._sampler.output(renderer=SpeedscopeRenderer()))
+        else:
+            self._sampler.disable()
+            path = os.path.join(self.output_dir, f"rerun-{stamp}.prof")
+            self._sampler.dump_stats(path)
+        self._sampler = None
+        self.output_path = path
+        return path
+
+    def breakdown(self):
+        """Таблиця секцій у порядку виконання: назва (з відступом вкладеності) і час"""
+        rows = [
+            {
+                "Секція": " " * depth + name,
+                "Час, мс": round(seconds * 1000, 1) if seconds is not None else None,
+            }
+            for name, depth, seconds in self.spans
+        ]
+        return pd.DataFrame(rows, columns=["Секція", "Час, мс"])
@@ -0,0 +1,138 @@
+"""
+Індекс префіксних сум для миттєвих сум за довільний період.
+
+Кумулятивні суми по днях будуються один раз при завантаженні даних, після
+чого сума будь-якого ряду за [start_date, end_date] — це різниця двох рядків
+масиву, незалежно від довжини періоду. Так само дешево рахуються порівняння
+з тим самим періодом місяць або рік тому.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cube import FLOW_COLUMNS
+from metrics import churned
+
+# Варіанти порівняння з попереднім періодом: назва -> зсув
+COMPARISON_OFFSETS = {
+    "Той самий період місяць тому": pd.DateOffset(months=1),
+    "Той самий період рік тому": pd.DateOffset(years=1),
+}
+
+
+def shift_period(start_date, end_date, offset):
+    """Той самий період, зсунутий назад на offset (наприклад, на місяць)"""
+    return (
+        (pd.Timestamp(start_date) - offset).date(),
+        (pd.Timestamp(end_date) - offset).date(),
+    )
+
+
+class PrefixSum:
+    """
+    Кумулятивні суми масиву `values` (дні × ...) по осі днів.
+    Дні йдуть підряд від `origin`, тож позиція дня обчислюється арифметикою.
+    """
+
+    def __init__(self, origin, values):
+        self.origin = pd.Timestamp(origin) if origin is not None else None
+        self.length = len(values)
+        self.cumsum = np.concatenate(
+            [np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0, dtype=float)]
+        )
+
+    def _bounds(self, start_date, end_date):
+        if self.origin is None:
+            return 0, 0
+        first = (pd.Timestamp(start_date) - self.origin).days
+        last = (pd.Timestamp(end_date) - self.origin).days + 1
+        first = min(max(first, 0), self.length)
+        last = min(max(last, first), self.length)
+        return first, last
+
+    def total(self, start_date, end_date):
+        """Сума за дні [start_date, end_date] (за межами даних — нулі)"""
+        first, last = self._bounds(start_date, end_date)
+        return self.cumsum[last] - self.cumsum[first]
+
+    def positions(self, start_dates, end_dates):
+        """Межі [first, last) у масиві днів для кожного періоду (векторно)"""
+        if self.origin is None:
+            zeros = np.zeros(len(start_dates), dtype=np.int64)
+            return zeros, zeros
+        first = (pd.DatetimeIndex(start_dates) - self.origin).days.to_numpy()
+        last = (pd.DatetimeIndex(end_dates) - self.origin).days.to_numpy() + 1
+        first = np.clip(first, 0, self.length)
+        last = np.clip(last, first, self.length)
+        return first, last
+
+    def totals(self, start_dates, end_dates):
+        """Суми за кілька періодів [start_dates[i], end_dates[i]] одним зверненням до масиву"""
+        first, last = self.positions(start_dates, end_dates)
+        return self.cumsum[last] - self.cumsum[first]
+
+
+class CubeIndex:
+    """
+    Префіксні суми для TariffCube: потоки кожного тарифу, Churned Users
+    кожного тарифу (з обрізанням нулем по днях) і кількість днів з даними.
+
+    Churned Users для набору тарифів разом обрізаються нулем по сумі тарифів,
+    тому їхній індекс будується окремо для кожного набору і запам'ятовується
+    разом з останнім днем з даними набору на кожен день (для зведень по
+    тижнях і місяцях).
+    """
+
+    MAX_SELECTIONS = 32
+
+    def __init__(self, cube):
+        self.cube = cube
+        origin = cube.dates[0] if len(cube.dates) else None
+        self.origin = origin
+        self.flows = PrefixSum(origin, cube.values)
+        self.churned = PrefixSum(origin, np.clip(churned(cube.values), 0, None))
+        self.days_present = PrefixSum(origin, cube.present.astype(float))
+        self._selections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def positions(self, tariffs):
+        """Позиції тарифів у кубі (відсутні в даних пропускаються)"""
+        return [self.cube.tariffs.index(name) for name in tariffs if name in self.cube.tariffs]
+
+    def value_on(self, day, column):
+        """Значення показника кожного тарифу на день `day` (поза межами — нулі)"""
+        position = self.cube.day_index(day)
+        if position is None:
+            return np.zeros(len(self.cube.tariffs))
+        return self.cube.values[position, :, FLOW_COLUMNS.index(column)]
+
+    def _selection(self, tariffs):
+        key = tuple(tariffs)
+        with self._lock:
+            if key in self._selections:
+                self._selections.move_to_end(key)
+                return self._selections[key]
+        positions = self.positions(tariffs)
+        totals = self.cube.values[:, positions].sum(axis=1)
+        present = self.cube.present[:, positions].any(axis=1)
+        selection = (
+            PrefixSum(self.origin, np.clip(churned(totals), 0, None)),
+            # Позиція останнього дня з даними набору не пізніше кожного дня (-1 — ще не було)
+            np.maximum.accumulate(np.where(present, np.arange(len(present)), -1)),
+        )
+        with self._lock:
+            self._selections[key] = selection
+            while len(self._selections) > self.MAX_SELECTIONS:
+                self._selections.popitem(last=False)
+        return selection
+
+    def selection_churned(self, tariffs):
+        """Префіксні суми Churned Users для набору тарифів разом"""
+        return self._selection(tariffs)[0]
+
+    def last_present(self, tariffs):
+        """Для кожного дня куба — позиція останнього дня з даними набору тарифів (або -1)"""
+        return self._selection(tariffs)[1]
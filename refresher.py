@@ -0,0 +1,157 @@
+"""
+Фонове оновлення даних дашборда.
+
+Потік-оновлювач стартує разом із сервером Streamlit (один на процес),
+одразу прогріває знімки всіх тарифів і файлів статистики та кеш усіх звітів
+GA4 сайту за типовий період, а далі оновлює їх за розкладом — без участі сесій
+користувачів. Стан кожного джерела показується в бічній панелі.
+
+Запуск `python refresher.py` виконує одноразовий прогрів дискового кешу
+(наприклад, під час деплою, ще до старту сервера).
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from cache_backend import SQLiteCacheBackend
+from ga4_cache import DailyReportCache
+from ga4_client import build_client
+from snapshot_store import CACHE_FILE, DEFAULT_ROOT, SnapshotStore
+from sources import statistic_files, tariff_files
+
+# Звіти GA4 прогріваються за типовий період дашборда «Останні 30 днів»
+DEFAULT_GA4_DAYS = 30
+
+
+class BackgroundRefresher:
+    """Періодично викликає функції оновлення джерел і запам'ятовує їхній стан"""
+
+    def __init__(self, interval, max_workers=8):
+        self.interval = interval
+        self.sources = {}
+        self.status = {}
+        self.last_refresh = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refresh")
+
+    def add_source(self, name, refresh):
+        """Реєструє джерело: `refresh()` завантажує його і кладе в кеш"""
+        self.sources[name] = refresh
+        self.status[name] = {"state": "очікує", "updated": None, "seconds": None, "error": None}
+
+    def start(self):
+        """Запускає фоновий потік (повторний виклик нічого не робить)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="background-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_all()
+            self._stop.wait(self.interval)
+
+    def refresh_all(self):
+        """Оновлює всі джерела паралельно і чекає на завершення"""
+        wait([self._pool.submit(self._refresh_one, name) for name in self.sources])
+        self.last_refresh = datetime.now()
+
+    def _refresh_one(self, name):
+        status = self.status[name]
+        status["state"] = "оновлюється"
+        started = time.perf_counter()
+        try:
+            self.sources[name]()
+        except Exception as e:
+            # Попередні дані в кеші залишаються, показуємо лише помилку
+            status.update(state="помилка", error=str(e))
+        else:
+            status.update(state="ok", updated=datetime.now(), error=None)
+        finally:
+            status["seconds"] = round(time.perf_counter() - started, 2)
+
+    def status_table(self):
+        """Стан кожного джерела для бічної панелі"""
+        rows = [
+            {
+                "Джерело": name,
+                "Стан": status["state"] if not status["error"] else f"помилка: {status['error']}",
+                "Оновлено": status["updated"].strftime("%H:%M:%S") if status["updated"] else "—",
+                "Час, с": status["seconds"],
+            }
+            for name, status in self.status.items()
+        ]
+        return pd.DataFrame(rows, columns=["Джерело", "Стан", "Оновлено", "Час, с"])
+
+
+def default_period(store, tariff_files, today=None):
+    """
+    Типовий період дашборда «Останні 30 днів», як його рахує app.py: до
+    меншого з сьогодні й останнього дня даних тарифів (з метаданих знімків).
+    Недобові звіти (топ сторінок) кешуються саме за періодом, тож прогрів
+    влучає в кеш лише з тими самими межами.
+    """
+    end_date = today or date.today()
+    last_dates = [
+        pd.Timestamp(meta["last_date"]).date()
+        for meta in (store.meta(file_id) for file_id in tariff_files.values())
+        if meta is not None and meta.get("last_date")
+    ]
+    if last_dates:
+        end_date = min(end_date, max(last_dates))
+    return end_date - timedelta(days=DEFAULT_GA4_DAYS), end_date
+
+
+def register_sources(refresher, store, tariff_files, statistic_files,
+                     ga4_client=None, property_id=None, ga4_cache=None, ga4_scheduler=None):
+    """
+    Додає до оновлювача всі файли Drive і всі звіти GA4 сайту
+    (build_site_requests) за типовий період одним пакетним запитом.
+    `ga4_client` — клієнт GA4 або функція без аргументів, яка його повертає
+    (тоді клієнт і модулі GA4 створюються лише при першому оновленні звітів).
+    """
+    for name, file_id in tariff_files.items():
+        refresher.add_source(f"Тариф: {name}", lambda file_id=file_id: store.refresh(file_id))
+    for name, file_id in statistic_files.items():
+        refresher.add_source(f"Статистика: {name}", lambda file_id=file_id: store.refresh(file_id))
+
+    if ga4_client is None:
+        return
+
+    def refresh_reports():
+        from ga4_reports import fetch_site_reports
+
+        client = ga4_client() if callable(ga4_client) else ga4_client
+        start_date, end_date = default_period(store, tariff_files)
+        fetch_site_reports(client, property_id, start_date, end_date, cache=ga4_cache, scheduler=ga4_scheduler)
+
+    refresher.add_source("GA4: звіти сайту", refresh_reports)
+
+
+if __name__ == "__main__":
+    # Одноразовий прогрів дискового кешу з тими ж налаштуваннями, що й у дашборда
+    root = st.secrets.get("snapshot_dir", DEFAULT_ROOT)
+    backend = SQLiteCacheBackend(st.secrets.get("cache_path", os.path.join(root, CACHE_FILE)))
+    warmup = BackgroundRefresher(interval=0)
+    register_sources(
+        warmup,
+        SnapshotStore(backend=backend),
+        tariff_files,
+        statistic_files,
+        ga4_client=build_client(st.secrets["google_credentials"]),
+        property_id=st.secrets["property_id"],
+        ga4_cache=DailyReportCache(backend=backend),
+    )
+    warmup.refresh_all()
+    print(warmup.status_table().to_string(index=False))
@@ -0,0 +1,158 @@
+"""
+Зведення рядів за днями, ISO-тижнями і місяцями для довгих періодів.
+
+На «Останній рік» і «Весь час» графіки вкладок «Статистика передплат» і
+«Активність» малювали й агрегували тисячі денних рядків. Тепер для
+періоду обирається гранулярність (дні, поки їх не більше MAX_ROLLUP_ROWS,
+інакше тижні, інакше місяці), і ряд рахується одразу по періодах з
+уже побудованих префіксних сум — кілька десятків рядків замість тисяч.
+Поріг — між «Останні 6 місяців» (до 185 днів, лишаються по днях) і
+«Останній рік»; вручну вибраний період теж зводиться, лише якщо він
+довший за MAX_ROLLUP_ROWS днів:
+
+- потоки передплат і Churned Users — сума за період;
+- start, end, total і MRR — значення на останній день періоду з даними;
+- active (тріали) — середнє за дні періоду.
+
+Крайні періоди обрізаються межами вибраного діапазону, тож суми за
+тиждень чи місяць, що частково виходить за діапазон, враховують лише
+вибрані дні.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import FLOW_COLUMNS
+from metrics import START
+
+# Скільки рядків (точок) має бути на графіку щонайбільше, перш ніж перейти до грубішої гранулярності:
+# більше за «Останні 6 місяців» (до 185 днів) і менше за «Останній рік» (366–367 днів)
+MAX_ROLLUP_ROWS = 200
+
+# Гранулярності від найдрібнішої: код -> підпис
+GRANULARITIES = {
+    "D": "днях",
+    "W": "ISO-тижнях",
+    "M": "місяцях",
+}
+
+_DAY = np.timedelta64(1, "D")
+
+# Колонки, які зводяться не як сума
+LAST_COLUMNS = ["start", "end", "total"]
+MEAN_COLUMNS = ["active"]
+
+
+def period_bounds(start_date, end_date, granularity):
+    """
+    Початки і кінці періодів, що покривають [start_date, end_date]:
+    перший період починається з start_date, останній закінчується end_date.
+    """
+    start = np.datetime64(pd.Timestamp(start_date).date(), "D")
+    end = np.datetime64(pd.Timestamp(end_date).date(), "D")
+    if end < start:
+        empty = pd.DatetimeIndex([])
+        return empty, empty
+
+    if granularity == "D":
+        starts = np.arange(start, end + _DAY, dtype="datetime64[D]")
+    else:
+        if granularity == "W":
+            # Понеділки після start (1970-01-01 — четвер, тож понеділок — (дні + 3) % 7 == 0)
+            first = start + (-(start.astype(np.int64) + 3)) % 7
+            boundaries = np.arange(first, end + _DAY, 7, dtype="datetime64[D]")
+        else:
+            month = start.astype("datetime64[M]")
+            boundaries = np.arange(month + 1, end.astype("datetime64[M]") + 1, dtype="datetime64[M]")
+            boundaries = boundaries.astype("datetime64[D]")
+        starts = np.concatenate([[start], boundaries[boundaries > start]])
+
+    ends = np.append(starts[1:] - _DAY, end)
+    return pd.DatetimeIndex(starts.astype("datetime64[ns]")), pd.DatetimeIndex(ends.astype("datetime64[ns]"))
+
+
+def choose_granularity(start_date, end_date, max_rows=MAX_ROLLUP_ROWS):
+    """Найдрібніша гранулярність, за якої період займає не більше max_rows рядків"""
+    for granularity in GRANULARITIES:
+        if len(period_bounds(start_date, end_date, granularity)[0]) <= max_rows:
+            return granularity
+    return list(GRANULARITIES)[-1]
+
+
+def rollup_metrics(index, tariffs, start_date, end_date, granularity):
+    """
+    Ряди вибраних тарифів разом по періодах — ті самі колонки, що й у
+    daily_metrics (date — початок періоду). Потоки і Churned Users
+    (обрізані нулем по днях) — суми з префіксних сум CubeIndex; start, end
+    і MRR — на останній день періоду з даними. Періоди без жодного дня
+    з даними пропускаються.
+    """
+    starts, ends = period_bounds(start_date, end_date, granularity)
+    positions = index.positions(tariffs)
+    cube = index.cube
+
+    flows = index.flows.totals(starts, ends)[:, positions].sum(axis=1)
+    churned_users = np.clip(index.selection_churned(tariffs).totals(starts, ends), 0, None)
+
+    # Останній день з даними в кожному періоді (-1 — у періоді немає днів куба)
+    first, last = index.flows.positions(starts, ends)
+    last_day = np.full(len(starts), -1)
+    in_cube = last > first
+    last_day[in_cube] = index.last_present(tariffs)[last[in_cube] - 1]
+    has_data = last_day >= first
+
+    stock = cube.values[last_day[has_data]][:, positions]
+    rolled = pd.DataFrame(flows[has_data], columns=FLOW_COLUMNS)
+    for column in ("start", "end"):
+        rolled[column] = stock[:, :, FLOW_COLUMNS.index(column)].sum(axis=1)
+    rolled.insert(0, "date", starts[has_data])
+    rolled["Churned Users"] = churned_users[has_data]
+    rolled["MRR"] = stock[:, :, START] @ cube.prices[positions]
+    return rolled
+
+
+def rollup_frame(df, starts, ends, prefix=None):
+    """
+    Таблицю з індексом за датою (як у StatFrames) зводить по періодах
+    [starts[i], ends[i]] з period_bounds: LAST_COLUMNS — останнє значення
+    періоду, MEAN_COLUMNS — середнє, решта числових колонок — сума.
+    `prefix` — заздалегідь пораховані stat_prefix(df), щоб не проходити
+    по рядках таблиці.
+    """
+    if df.empty:
+        return df.iloc[:0]
+    first = df.index.searchsorted(starts, side="left")
+    last = df.index.searchsorted(ends, side="right")
+    has_rows = last > first
+    first, last = first[has_rows], last[has_rows]
+
+    rolled = {"date": starts[has_rows]}
+    prefix = prefix if prefix is not None else stat_prefix(df)
+    for column in df.columns:
+        if column == "date":
+            continue
+        if column in LAST_COLUMNS:
+            rolled[column] = df[column].to_numpy()[last - 1]
+        elif column in prefix:
+            sums, counts = prefix[column]
+            total = sums[last] - sums[first]
+            if column in MEAN_COLUMNS:
+                count = counts[last] - counts[first]
+                total = np.divide(total, count, out=np.full(len(total), np.nan), where=count > 0)
+            rolled[column] = total
+    return pd.DataFrame(rolled)
+
+
+def stat_prefix(df):
+    """Префіксні суми і кількості непорожніх значень для колонок, які зводяться сумою чи середнім"""
+    prefix = {}
+    for column in df.columns:
+        if column == "date" or column in LAST_COLUMNS or not pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        values = df[column].to_numpy(dtype=float)
+        finite = np.isfinite(values)
+        prefix[column] = (
+            np.concatenate([[0.0], np.cumsum(np.where(finite, values, 0.0))]),
+            np.concatenate([[0], np.cumsum(finite)]),
+        )
+    return prefix
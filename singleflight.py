@@ -0,0 +1,83 @@
+"""
+Об'єднання однакових запитів, що виконуються одночасно (single-flight).
+
+Коли кілька сесій дашборда одночасно просять той самий файл Drive або той
+самий звіт GA4, виконується лише перший виклик, а решта чекає на його
+результат (або на його помилку) замість того, щоб робити власний запит.
+Блокування — окреме для кожного ключа: різні файли і звіти завантажуються
+паралельно.
+"""
+
+import threading
+
+
+class _Call:
+    """Виклик, що виконується: результат або помилка з'являться після done"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Виконує func() для ключа не більше одного разу одночасно.
+
+    Лічильники: calls — усі виклики do(), executed — скільки разів func()
+    справді виконувалась, coalesced — скільки викликів отримали чужий
+    результат, timeouts — скільки очікувань перевищили timeout.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        """
+        Результат func() для ключа `key`. Якщо такий самий виклик уже
+        виконується — чекає на нього не довше `timeout` секунд (None — без
+        обмеження) і повертає його результат або піднімає його виняток.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = func()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                call.done.set()
+        elif not call.done.wait(timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Не дочекалися результату однакового запиту за {timeout} с: {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """Лічильники викликів для бічної панелі"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._in_flight),
+            }
@@ -0,0 +1,269 @@
+"""
+Сховище знімків (snapshot) файлів з Google Drive.
+
+Кожен file_id зберігається у спільному кеші (CacheBackend) як Parquet разом
+з JSON-метаданими (час завантаження і хеш вмісту); таблиця і метадані
+записуються однією транзакцією кешу. Читання завжди віддає
+знімок з кешу одразу, а якщо він старший за TTL — у фоні запускається
+оновлення з Drive (stale-while-revalidate). Так холодний старт після деплою
+не залежить від швидкості Google Drive.
+
+Кеш спільний для всіх процесів сервера: оновлення файлу виконується під
+блокуванням кешу, і якщо інша репліка щойно (менше ніж за половину TTL)
+оновила знімок, файл повторно не завантажується.
+
+CSV тарифів і статистики — це журнали, до яких лише дописуються нові дні.
+Тому для кожного файлу запам'ятовується позначка (довжина вже розібраного
+вмісту в байтах, останні байти перед нею, заголовок CSV і остання дата), і
+оновлення завантажує лише новий хвіст через HTTP Range: останні байти перед
+позначкою перевіряють, що початок файлу не змінився, а рядки з датою не
+новішою за останню відкидаються. Останній рядок без завершального переводу
+рядка теж вважається повним: і повний файл, і хвіст `bytes=start-` доходять
+до кінця файлу, тож обірваним він бути не може. Якщо Range не підтримується,
+файл змінився не лише в кінці або минув інтервал повної синхронізації —
+файл завантажується повністю, як раніше.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from cache_backend import SQLiteCacheBackend, frame_bytes, json_bytes
+from data_loader import DEFAULT_TIMEOUT, fetch_byte_range, fetch_bytes, parse_csv
+from singleflight import SingleFlight
+
+DEFAULT_ROOT = ".snapshots"
+DEFAULT_TTL = 15 * 60  # секунд
+CACHE_FILE = "cache.sqlite"
+
+# Скільки байтів перед позначкою завантажувати повторно, щоб перевірити, що файл лише доповнювався
+TAIL_OVERLAP = 64
+
+# Як часто все одно завантажувати файл повністю (підхопити виправлення в старих рядках)
+DEFAULT_RESYNC_INTERVAL = 24 * 60 * 60  # секунд
+
+
+class SnapshotStore:
+    """Знімки файлів Drive у спільному кеші з фоновим оновленням за TTL"""
+
+    def __init__(self, root=DEFAULT_ROOT, ttl=DEFAULT_TTL, fetch=fetch_bytes, max_workers=4,
+                 incremental=True, fetch_range=fetch_byte_range, resync_interval=DEFAULT_RESYNC_INTERVAL,
+                 backend=None):
+        self.backend = backend or SQLiteCacheBackend(os.path.join(root, CACHE_FILE))
+        self.ttl = ttl
+        self.fetch = fetch
+        self.incremental = incremental
+        self.fetch_range = fetch_range
+        self.resync_interval = resync_interval
+        self.errors = {}
+        self.flights = SingleFlight()
+        self._refreshing = set()
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="snapshot")
+
+    def meta(self, file_id):
+        """Метадані знімка: fetched_at (unix time) і sha256, або None"""
+        return self.backend.get_json(f"snapshot:{file_id}:meta")
+
+    def _read(self, file_id, meta):
+        """
+        Таблиця знімка з метаданими meta. Розібрана таблиця береться з пам'яті
+        процесу, поки версія вмісту в метаданих не змінилася, — без читання
+        і розбору Parquet на кожен перезапуск.
+        """
+        version = _version(meta)
+        with self._lock:
+            cached = self._frames.get(file_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = self.backend.get_frame(f"snapshot:{file_id}:data")
+        if df is not None:
+            with self._lock:
+                self._frames[file_id] = (version, df)
+        return df
+
+    def _write(self, file_id, meta, df, changed=True):
+        """
+        Записує метадані знімка і, якщо вона змінилася, його таблицю однією
+        транзакцією: після збою таблиця не розійдеться з позначкою хвоста
+        в метаданих (інакше наступне дописування задублювало б рядки).
+        """
+        items = {f"snapshot:{file_id}:meta": json_bytes(meta)}
+        if changed:
+            items[f"snapshot:{file_id}:data"] = frame_bytes(df)
+        self.backend.set_many(items)
+        with self._lock:
+            self._frames[file_id] = (_version(meta), df)
+
+    def fingerprint(self, file_ids):
+        """
+        Дешевий відбиток знімків file_ids — версії вмісту з метаданих, без
+        читання таблиць; ключ кешу для куба та індексів. Береться до
+        завантаження таблиць: якщо знімок оновиться між ними, таблиці
+        будуть новішими за відбиток, і вже наступний перезапуск побачить
+        новий відбиток і перебудує індекси.
+        """
+        fingerprint = []
+        for file_id in file_ids:
+            meta = self.meta(file_id)
+            fingerprint.append((file_id, None if meta is None else _version(meta)))
+        return tuple(fingerprint)
+
+    def is_stale(self, meta):
+        """Чи минув TTL знімка з метаданими meta (None — знімка ще немає)"""
+        return meta is None or time.time() - meta["fetched_at"] > self.ttl
+
+    def get(self, file_id, timeout=DEFAULT_TIMEOUT):
+        """
+        Повертає DataFrame для file_id.
+
+        Якщо знімок є в кеші — віддає його одразу і, за потреби, планує
+        фонове оновлення. Якщо знімка ще немає — завантажує файл синхронно.
+        Таблиця з кешу спільна для всіх сесій процесу, тож її не змінюють
+        на місці.
+        """
+        meta = self.meta(file_id)
+        df = self._read(file_id, meta) if meta is not None else None
+        if df is not None:
+            if self.is_stale(meta):
+                self.refresh_async(file_id, timeout)
+            return df
+        return self.refresh(file_id, timeout)
+
+    def refresh(self, file_id, timeout=DEFAULT_TIMEOUT):
+        """
+        Оновлює знімок з Drive: дописує лише нові рядки, якщо це можливо,
+        інакше завантажує файл повністю.
+
+        Одночасні оновлення того самого файлу (кілька сесій, фонове оновлення)
+        об'єднуються: завантаження йде один раз, решта чекає на його результат.
+        Кожен виклик отримує власну копію таблиці.
+        """
+        return self.flights.do(file_id, lambda: self._refresh(file_id, timeout), timeout=timeout * 4).copy()
+
+    def _refresh(self, file_id, timeout):
+        # Блокування між процесами: файл одночасно оновлює лише одна репліка
+        with self.backend.lock(f"snapshot:{file_id}", timeout=timeout * 2):
+            meta = self.meta(file_id)
+            df = self._read(file_id, meta) if meta is not None else None
+            # Знімок, який інший процес оновив щойно, не завантажуємо вдруге
+            if df is None or time.time() - meta["fetched_at"] > self.ttl / 2:
+                df = self._fetch_and_store(file_id, meta, df, timeout)
+        self.errors.pop(file_id, None)
+        return df
+
+    def _fetch_and_store(self, file_id, meta, df, timeout):
+        if df is not None and self._can_append(meta):
+            appended = self._refresh_tail(file_id, meta, df, timeout)
+            if appended is not None:
+                return appended
+        return self._store_full(file_id, self.fetch(file_id, timeout), meta)
+
+    def _can_append(self, meta):
+        return (
+            self.incremental
+            and meta.get("byte_length")
+            and time.time() - meta.get("full_fetched_at", 0) < self.resync_interval
+        )
+
+    def _store_full(self, file_id, content, meta):
+        """Знімок з повного вмісту файлу (перезаписує Parquet лише якщо вміст змінився)"""
+        digest = hashlib.sha256(content).hexdigest()
+        df = None
+        if meta is not None and meta.get("sha256") == digest:
+            df = self._read(file_id, meta)
+        changed = df is None
+        if changed:
+            df = parse_csv(content)
+
+        # Позначка — кінець розібраного вмісту, разом з останнім рядком без \n
+        byte_length = len(content)
+        header = content.split(b"\n", 1)[0] + b"\n"
+        now = time.time()
+        self._write(file_id, {
+            "file_id": file_id,
+            "fetched_at": now,
+            "full_fetched_at": now,
+            "sha256": digest,
+            "rows": len(df),
+            "byte_length": byte_length,
+            "overlap": content[max(byte_length - TAIL_OVERLAP, 0):byte_length].hex(),
+            "header": header.hex(),
+            "last_date": _last_date(df),
+        }, df, changed)
+        return df
+
+    def _refresh_tail(self, file_id, meta, df, timeout):
+        """
+        Дописує до знімка нові рядки з хвоста файлу. Повертає None, якщо
+        хвіст використати не можна і файл треба завантажити повністю.
+        """
+        overlap = bytes.fromhex(meta["overlap"])
+        content, partial = self.fetch_range(file_id, meta["byte_length"] - len(overlap), timeout)
+        if not partial:
+            # Сервер не підтримує Range — прийшов увесь файл
+            return self._store_full(file_id, content, meta)
+        if content is None or not content.startswith(overlap):
+            # Файл став коротшим або змінився не лише в кінці
+            return None
+
+        # Range відкритий (bytes=start-), тож 206 завжди доходить до кінця файлу:
+        # останній рядок без \n — повний. Хвіст може починатися з \n, який
+        # дописали до такого рядка в минулому знімку, — порожні рядки read_csv пропускає
+        new_bytes = content[len(overlap):]
+
+        appended = None
+        if new_bytes.strip():
+            tail = parse_csv(bytes.fromhex(meta["header"]) + new_bytes)
+            if meta.get("last_date"):
+                # Дні, які вже є в знімку, не дублюємо
+                tail = tail[tail["date"] > pd.Timestamp(meta["last_date"])]
+            if len(tail):
+                df = appended = pd.concat([df, tail], ignore_index=True)
+
+        self._write(file_id, {
+            **meta,
+            "fetched_at": time.time(),
+            # Повний вміст файлу після дописування невідомий; без нових байтів він той самий
+            "sha256": meta.get("sha256") if not new_bytes else None,
+            "rows": len(df),
+            "byte_length": meta["byte_length"] + len(new_bytes),
+            "overlap": (overlap + new_bytes)[-TAIL_OVERLAP:].hex(),
+            "last_date": _last_date(df),
+        }, df, appended is not None)
+        return df
+
+    def refresh_async(self, file_id, timeout=DEFAULT_TIMEOUT):
+        """Планує фонове оновлення знімка, якщо воно ще не виконується"""
+        with self._lock:
+            if file_id in self._refreshing:
+                return
+            self._refreshing.add(file_id)
+        self._pool.submit(self._background_refresh, file_id, timeout)
+
+    def _background_refresh(self, file_id, timeout):
+        try:
+            self.refresh(file_id, timeout)
+        except Exception as e:
+            # Залишаємо старий знімок, а помилку запам'ятовуємо для відображення
+            self.errors[file_id] = str(e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(file_id)
+
+
+def _version(meta):
+    """Версія вмісту знімка з метаданих: змінюється лише разом з таблицею, а не з fetched_at"""
+    return meta.get("sha256"), meta.get("byte_length"), meta.get("rows")
+
+
+def _last_date(df):
+    """Остання дата в таблиці (ISO-рядок) або None"""
+    if df.empty or "date" not in df:
+        return None
+    return pd.Timestamp(df["date"].max()).isoformat()
@@ -0,0 +1,34 @@
+"""
+Списки файлів Google Drive, з яких будується дашборд.
+
+Винесені окремо, щоб їх могли використовувати і дашборд, і фонове
+оновлення даних без запуску інтерфейсу Streamlit.
+"""
+
+# 📂 Список файлів зі статистикою по компаніям, студентам, профілям та тріалам
+statistic_files = {
+    "companies": "1OVBwvUjNbJFY_cvLCh6RynL_WKowqXJ2",
+    "students": "1gJTkWUssnOKKlBSIxk6rQETuEaFTA9EL",
+    "users": "1nuxKPhBP1qx09FcuCPG1uIobrG92dxHE",
+    "trials": "1AsIIcj-2lYQWXHfPoMWsdtA46nqUbduH",
+    "companies_awards": "1XXE81yxnme1LUis4EoobyJ_4chMrl3Cr",
+    "companies_services": "19zeQ2ArE6DdlU1WtIUzLY43sfW3tFc1A",
+    "news": "1Dlc-hFOQkjXoszv4uZVulFgZ4AxslxlP",
+    "articles": "1sYk2s9HyS-YuXieILm6eAyf1uHLSSVel",
+    "cases": "1VEWKmAv2EmFkcYTNWzsvtcpaeoYREqqu",
+}
+
+# 📦 Список тарифів
+tariff_files = {
+    "Full Access 0UAH": "1XoUhnsGUeVL3qwHMYJbk4mpCn3lhoEkB",
+    "Full Access 250UAH": "1G60JUAk_vQVXVQnjZF9uK2VwUbYDlK6P",
+    "Full Access 350UAH": "1eYubeexGVF5MKJFZIF6ZOwEfDDad1zPB",
+    "Full Access 390UAH": "1xeTeJV8JvOowE8JG5I6tog3euIKvDDNj",
+    "Full Access 550UAH": "1b5fMQ_5Y522zJssO_AikhkLBTfI3p_Bf",
+    "Full Access 1000UAH": "1mOZsP89AhTufFvG2nSmbV6w5GSOKyGVx",
+    "Full Access 1200UAH": "1M1u8AAQHFv81BNtlvi4P6llT0OO817dj",
+    "Theory Only 0UAH": "1SyARqxHQzEPlK9GEuUvNV1SEFeghJ1pr",
+    "Theory Only 250UAH": "1q4c0m434WK46Thei_pgkdVB5lLDnQqZz",
+    "Theory Only 500UAH": "1eFhAfdSC2LOLX3tJX5BWyGM693d0ASyK",
+    "Theory Only 600UAH": "1EdZRWRQxLUfKprV5GgRWjjR_Jzyc7CEh",
+}
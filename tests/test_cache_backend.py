@@ -0,0 +1,42 @@
+"""Атомарність set_many і абстрактний інтерфейс CacheBackend"""
+
+import pytest
+
+from cache_backend import CacheBackend, MemoryCacheBackend, SQLiteCacheBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCacheBackend()
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite"))
+
+
+def test_set_many_writes_all_keys(backend):
+    backend.set_many({"a": b"1", "b": b"2"})
+
+    assert backend.get("a") == b"1"
+    assert backend.get("b") == b"2"
+
+
+def test_set_many_writes_nothing_on_failure(backend):
+    backend.set_many({"a": b"old", "b": b"old"})
+
+    # None не перетворюється на байти: запис падає на другому ключі
+    with pytest.raises(TypeError):
+        backend.set_many({"a": b"new", "b": None})
+
+    assert backend.get("a") == b"old"
+    assert backend.get("b") == b"old"
+
+
+def test_backend_without_set_many_cannot_be_created():
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+
+        def set(self, key, value, ttl=None):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
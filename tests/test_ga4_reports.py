@@ -0,0 +1,64 @@
+"""Дочитування сторінок звітів GA4 у run_reports"""
+
+from datetime import date
+
+import pandas as pd
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse, DimensionValue, MetricValue, Row, RunReportResponse,
+)
+
+from ga4_reports import build_site_requests, response_to_df, run_reports, _columns
+
+# Скільки рядків фейковий GA4 віддає без явного limit (у справжнього — 10 000)
+DEFAULT_PAGE = 7
+TOP_ROWS = 30
+
+
+class PagedGA4:
+    """Фейковий клієнт batchRunReports з offset/limit і row_count, як у GA4"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def batch_run_reports(self, batch_request):
+        self.calls += 1
+        return BatchRunReportsResponse(reports=[self._report(r) for r in batch_request.requests])
+
+    def _report(self, request):
+        dimensions, metrics = _columns(request)
+        if dimensions[0] == "date":
+            date_range = request.date_ranges[0]
+            days = pd.date_range(date_range.start_date, date_range.end_date).strftime("%Y%m%d")
+            if len(dimensions) > 1:
+                values = [[day, os] for day in days for os in ("Android", "iOS")]
+            else:
+                values = [[day] for day in days]
+        else:
+            values = [[f"/page-{i}"] for i in range(TOP_ROWS)]
+        limit = request.limit or DEFAULT_PAGE
+        page = values[request.offset:request.offset + limit]
+        return RunReportResponse(
+            rows=[
+                Row(
+                    dimension_values=[DimensionValue(value=v) for v in row],
+                    metric_values=[MetricValue(value="1") for _ in metrics],
+                )
+                for row in page
+            ],
+            row_count=len(values),
+        )
+
+
+def test_reports_without_limit_are_read_to_the_end():
+    client = PagedGA4()
+    requests = build_site_requests(date(2025, 1, 1), date(2025, 1, 10))
+
+    responses = run_reports(client, "0", requests)
+
+    pwa = response_to_df(responses["pwa"], *_columns(requests["pwa"]))
+    assert len(pwa) == 20
+    assert not pwa.duplicated(["date", "operatingSystem"]).any()
+    assert len(responses["traffic"].rows) == 10
+    # Топ сторінок має явний limit — лише перша сторінка
+    assert len(responses["pages"].rows) == 10
+    assert client.calls > 1
@@ -0,0 +1,107 @@
+"""Дописування хвоста файлу в SnapshotStore: файли з \\n в кінці і без нього"""
+
+import pandas as pd
+import pytest
+
+from cache_backend import MemoryCacheBackend
+from snapshot_store import SnapshotStore
+
+FILE_ID = "tariff"
+
+
+def csv_bytes(rows, trailing_newline):
+    """CSV з `rows` днями, починаючи з 2025-01-01"""
+    days = pd.date_range("2025-01-01", periods=rows).strftime("%Y-%m-%d")
+    content = "\n".join(["date,value"] + [f"{day},{i}" for i, day in enumerate(days)])
+    return (content + "\n" if trailing_newline else content).encode()
+
+
+class RangeDrive:
+    """Замінник Drive з підтримкою Range; файл росте, як журнал, між оновленнями"""
+
+    def __init__(self):
+        self.content = b""
+        self.full_fetches = 0
+        self.range_fetches = 0
+
+    def grow(self, rows, trailing_newline):
+        # Дописування до файлу без \n в кінці спершу завершує його останній рядок
+        content = csv_bytes(rows, trailing_newline)
+        assert content.startswith(self.content)
+        self.content = content
+
+    def fetch(self, file_id, timeout):
+        self.full_fetches += 1
+        return self.content
+
+    def fetch_range(self, file_id, start, timeout):
+        self.range_fetches += 1
+        if start >= len(self.content):
+            return None, True
+        return self.content[start:], True
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_appended_rows_match_full_file(trailing_newline):
+    drive = RangeDrive()
+    # ttl < 0: кожен refresh справді звертається до Drive
+    store = SnapshotStore(ttl=-1, fetch=drive.fetch, fetch_range=drive.fetch_range,
+                          backend=MemoryCacheBackend())
+
+    for rows in (30, 31, 33):
+        drive.grow(rows, trailing_newline)
+        df = store.refresh(FILE_ID)
+        assert len(df) == rows
+        assert df["date"].is_unique
+        assert df["date"].iloc[-1] == pd.Timestamp("2025-01-01") + pd.Timedelta(days=rows - 1)
+        assert store.meta(FILE_ID)["byte_length"] == len(drive.content)
+
+    assert drive.full_fetches == 1
+    assert drive.range_fetches == 2
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_unchanged_file_adds_nothing(trailing_newline):
+    drive = RangeDrive()
+    store = SnapshotStore(ttl=-1, fetch=drive.fetch, fetch_range=drive.fetch_range,
+                          backend=MemoryCacheBackend())
+    drive.grow(30, trailing_newline)
+    store.refresh(FILE_ID)
+
+    df = store.refresh(FILE_ID)
+
+    assert len(df) == 30
+    assert drive.full_fetches == 1
+
+
+class CountingBackend(MemoryCacheBackend):
+    """Рахує розбори Parquet зі сховища"""
+
+    def __init__(self):
+        super().__init__()
+        self.frame_reads = 0
+
+    def get_frame(self, key):
+        self.frame_reads += 1
+        return super().get_frame(key)
+
+
+def test_get_reuses_parsed_frame_until_snapshot_changes():
+    drive = RangeDrive()
+    backend = CountingBackend()
+    store = SnapshotStore(ttl=60, fetch=drive.fetch, fetch_range=drive.fetch_range, backend=backend)
+    drive.grow(30, trailing_newline=True)
+    store.refresh(FILE_ID)
+
+    first = store.get(FILE_ID)
+    assert store.get(FILE_ID) is first
+    assert backend.frame_reads == 0
+
+    # Інша репліка дописала знімок: версія в метаданих змінилася
+    drive.grow(31, trailing_newline=True)
+    other = SnapshotStore(ttl=-1, fetch=drive.fetch, fetch_range=drive.fetch_range, backend=backend)
+    other.refresh(FILE_ID)
+    reads = backend.frame_reads
+
+    assert len(store.get(FILE_ID)) == 31
+    assert backend.frame_reads == reads + 1
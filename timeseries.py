@@ -0,0 +1,60 @@
+"""
+Контейнер для рядів статистики (компанії, студенти, профілі, тріали тощо).
+
+Кожна таблиця один раз сортується та індексується за датою, після чого
+вибір періоду — це два бінарні пошуки по індексу і зріз за позиціями
+замість двох булевих масок на всю довжину таблиці.
+
+Для довгих періодів rollup_all() віддає ряди по тижнях чи місяцях через
+rollups.rollup_frame з префіксних сум, порахованих один раз при побудові.
+"""
+
+import pandas as pd
+
+from rollups import period_bounds, rollup_frame, stat_prefix
+
+# Колонки порожньої таблиці для файлу, який не вдалося завантажити
+EMPTY_COLUMNS = ["date", "total", "active"]
+
+
+class StatFrames:
+    """Набір таблиць {назва: DataFrame}, відсортованих і проіндексованих за date"""
+
+    def __init__(self, frames, names=None):
+        self.frames = {}
+        self.prefixes = {}
+        for name in names or list(frames):
+            df = frames.get(name)
+            if df is None:
+                df = pd.DataFrame(columns=EMPTY_COLUMNS).astype({"date": "datetime64[ns]"})
+            # Колонку date залишаємо — графіки будуються по ній
+            df = df.set_index("date", drop=False).rename_axis(None)
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index(kind="stable")
+            self.frames[name] = df
+            self.prefixes[name] = stat_prefix(df)
+
+    def __getitem__(self, name):
+        return self.frames[name]
+
+    def slice(self, name, start_date, end_date):
+        """Рядки таблиці за дні [start_date, end_date] — зріз за позиціями, без маски"""
+        df = self.frames[name]
+        first = df.index.searchsorted(pd.Timestamp(start_date), side="left")
+        last = df.index.searchsorted(pd.Timestamp(end_date), side="right")
+        return df.iloc[first:last]
+
+    def slice_all(self, start_date, end_date):
+        """Зрізи всіх таблиць за період одним викликом: {назва: DataFrame}"""
+        return {name: self.slice(name, start_date, end_date) for name in self.frames}
+
+    def rollup_all(self, start_date, end_date, granularity, names=None):
+        """
+        Ряди всіх таблиць (або `names`) за період по днях ("D"), ISO-тижнях
+        ("W") або місяцях ("M") одним викликом: {назва: DataFrame}
+        """
+        names = names or list(self.frames)
+        if granularity == "D":
+            return {name: self.slice(name, start_date, end_date) for name in names}
+        starts, ends = period_bounds(start_date, end_date, granularity)
+        return {name: rollup_frame(self.frames[name], starts, ends, self.prefixes[name]) for name in names}